@@ -7,8 +7,13 @@
 """
 # pip install tabulate
 import tabulate
+import time
 # Import database controller library
 import db_operations
+# Duplicate contact finder
+import dedupe
+# vCard import and export
+import vcard
 
 
 class AddressBook:
@@ -28,8 +33,16 @@ class AddressBook:
         USER_CHOICE = """
 (C)reate contact
 (R)etrieve contacts
+(S)earch contacts
+(P)honetic search, sounds like
+(F)ind duplicate contacts
 (D)elete contact
 (B)ackup database to SQL
+(O)nline backup of the database file
+(I)mport contacts from CSV
+(E)xport contacts to CSV
+(V)Card import from a .vcf file
+(W)rite contacts to a .vcf file
 (Q)uit
 -->> """
         user_input = input(USER_CHOICE)
@@ -47,6 +60,18 @@ class AddressBook:
             elif user_input == "r":
                 self.fetch_all_records()
 
+        # ----------------------- SEARCH RECORDS ------------------------- #
+            elif user_input == "s":
+                self.search()
+
+        # ---------------------- PHONETIC SEARCH ------------------------- #
+            elif user_input == "p":
+                self.search_phonetic()
+
+        # ---------------------- FIND DUPLICATES ------------------------- #
+            elif user_input == "f":
+                self.find_duplicates()
+
         # ------------------- DELETE SELECTED RECORD --------------------- #
             elif user_input == "d":
                 self.fetch_all_records()
@@ -57,6 +82,25 @@ class AddressBook:
             elif user_input == "b":
                 self.db_op.database_dump()
 
+        # ---------------------- CSV IMPORT / EXPORT --------------------- #
+            elif user_input == "i":
+                self.import_csv()
+
+            elif user_input == "e":
+                self.export_csv()
+
+        # --------------------- VCARD IMPORT / EXPORT -------------------- #
+            elif user_input == "v":
+                self.import_vcards()
+
+            elif user_input == "w":
+                self.export_vcards()
+
+        # ----------------------- ONLINE BACKUP -------------------------- #
+            elif user_input == "o":
+                if self.db_op.backup():
+                    print(f"Database copied to {db_operations.BACKUP_FILE}")
+
             else:
                 print("Unknown option. Please try again")
 
@@ -65,6 +109,9 @@ class AddressBook:
             # Convert input into lower case
             user_input = user_input.lower()
 
+        # Close the pooled database connections
+        self.db_op.close()
+
 # -------------------------- INSERT RECORD --------------------------------#
     def insert_record(self):
         """Insert new record"""
@@ -97,6 +144,132 @@ class AddressBook:
             )
         )
 
+# ------------------------- SEARCH -----------------------------------------#
+    def search(self):
+        """Full text search of all contacts"""
+        query = input("Search for: ")
+        # Call controller search method, best matches first
+        records = self.db_op.search(query)
+        headers = ["id", "First Name", "Last Name", "Phone", "Email", "Match"]
+        if not records:
+            # No exact matches, look for names with a typo
+            records = self.db_op.fuzzy_search(query)
+            headers[-1] = "Typos"
+            print(f"\nNo exact matches, {len(records)} similar names")
+            if not records.complete:
+                # Short or common names can't be checked against
+                # every record, say so rather than miss names quietly
+                print("Only the likeliest names were checked, "
+                      "there may be other similar names")
+        else:
+            print(f"\n{len(records)} matching contacts")
+        print(
+            tabulate.tabulate(
+                records,
+                headers=headers,
+                tablefmt="psql"  # Table format
+            )
+        )
+
+# ------------------------- PHONETIC SEARCH --------------------------------#
+    def search_phonetic(self):
+        """Find contacts whose name sounds like the name entered"""
+        name = input("Name sounds like: ")
+        # Call controller phonetic search method
+        records = self.db_op.search_phonetic(name)
+        print(f"\n{len(records)} contacts sound like {name}")
+        print(
+            tabulate.tabulate(
+                records,
+                headers=["id", "First Name", "Last Name", "Phone", "Email"],
+                tablefmt="psql"  # Table format
+            )
+        )
+
+# ------------------------- FIND DUPLICATES --------------------------------#
+    def find_duplicates(self):
+        """Find and review possible duplicate contacts"""
+        count = dedupe.find_duplicates(self.db_op)
+        print(f"\n{count} possible duplicates found")
+        for suggestion in self.db_op.fetch_merge_suggestions():
+            id, score, reason, *records = suggestion
+            print(f"\nScore {score:.2f}, {reason}")
+            print(
+                tabulate.tabulate(
+                    [records[:5], records[5:]],
+                    headers=["id", "First Name", "Last Name",
+                             "Phone", "Email"],
+                    tablefmt="psql"  # Table format
+                )
+            )
+            answer = input("(M)erge, (K)eep both, (S)top reviewing: ")
+            answer = answer.lower()
+            if answer == "m":
+                # Fill the older record's blank fields from the
+                # newer record, then delete the newer record
+                self.db_op.accept_merge_suggestion(id)
+            elif answer == "k":
+                self.db_op.dismiss_merge_suggestion(id)
+            elif answer == "s":
+                break
+
+# ------------------------- CSV IMPORT / EXPORT ----------------------------#
+    def import_csv(self):
+        """Import contacts from a CSV file"""
+        path = input("CSV file to import: ")
+        start = time.perf_counter()
+        try:
+            imported, rejected, errors = self.db_op.import_csv(path)
+        except OSError as e:
+            print(f"Could not read {path}: {e}")
+            return
+        elapsed = time.perf_counter() - start
+        for error in errors:
+            print(error)
+        print(f"{imported:,} contacts imported, {rejected:,} rejected "
+              f"in {elapsed:.1f} s ({imported / elapsed:,.0f} rows/s)")
+
+    def export_csv(self):
+        """Export all contacts to a CSV file"""
+        path = input("CSV file to write (contacts.csv): ") or "contacts.csv"
+        start = time.perf_counter()
+        try:
+            rows = self.db_op.export_csv(path)
+        except OSError as e:
+            print(f"Could not write {path}: {e}")
+            return
+        elapsed = time.perf_counter() - start
+        print(f"{rows:,} contacts exported to {path} "
+              f"in {elapsed:.1f} s ({rows / elapsed:,.0f} rows/s)")
+
+# ------------------------ VCARD IMPORT / EXPORT ---------------------------#
+    def import_vcards(self):
+        """Import contacts from a vCard file"""
+        path = input("vCard file to import: ")
+        start = time.perf_counter()
+        try:
+            imported, duplicates = vcard.import_vcards(self.db_op, path)
+        except OSError as e:
+            print(f"Could not read {path}: {e}")
+            return
+        elapsed = time.perf_counter() - start
+        print(f"{imported:,} contacts imported, {duplicates:,} duplicate "
+              f"emails skipped in {elapsed:.1f} s "
+              f"({imported / elapsed:,.0f} cards/s)")
+
+    def export_vcards(self):
+        """Export all contacts to a vCard file"""
+        path = input("vCard file to write (contacts.vcf): ") or "contacts.vcf"
+        start = time.perf_counter()
+        try:
+            count = vcard.export_vcards(self.db_op, path)
+        except OSError as e:
+            print(f"Could not write {path}: {e}")
+            return
+        elapsed = time.perf_counter() - start
+        print(f"{count:,} contacts exported to {path} "
+              f"in {elapsed:.1f} s ({count / elapsed:,.0f} cards/s)")
+
 # ------------------------- DELETE RECORD ----------------------------------#
     def delete_record(self):
         """Delete selected record"""
@@ -107,5 +280,8 @@ class AddressBook:
 
 
 # ------------------------------ START PROGRAM -----------------------------#
-address_book = AddressBook()
-address_book.menu()
+# The guard keeps duplicate finder worker processes
+# from starting the program again
+if __name__ == "__main__":
+    address_book = AddressBook()
+    address_book.menu()
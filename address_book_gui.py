@@ -12,6 +12,10 @@ from tkinter import *
 from tkinter.ttk import *
 # Database operations library
 import db_operations
+# Virtual list mode for the treeview
+from virtual_treeview import VirtualTreeview
+# Run database calls on a worker thread
+from db_worker import DBWorker
 from address_book_png import icon_data_16
 from address_book_png import icon_data_32
 
@@ -88,13 +92,20 @@ class AddressBook:
             self.lbl_status.configure(text="Please fill out all entries")
         else:
             try:
-                # Insert record into database
-                self.db_op.insert_record(first_name, last_name, phone, email)
-
-                # Let the user know the add record was successful
-                self.lbl_status.configure(
-                    text=f"{first_name} {last_name} was successfully added."
-                )
+                def added(record):
+                    # Let the user know the add record was successful
+                    if record is not None:
+                        self.lbl_status.configure(
+                            text=f"{first_name} {last_name} "
+                            "was successfully added."
+                        )
+                    else:
+                        self.lbl_status.configure(text="Error")
+
+                # Insert record into database on the worker thread,
+                # the treeview adds just the new record when it's done
+                self.view.insert_record(
+                    first_name, last_name, phone, email, callback=added)
             except:
                 self.lbl_status.configure(
                     text=f"Error"
@@ -103,38 +114,15 @@ class AddressBook:
         # Clear the entry widgets
         self.clear_entry_widgets()
 
-        # Display all records in treeview
-        self.fetch_all_records()
-
         # Set focus to entry widget for next entry
         self.entry_fname.focus()
 
 # ------------------------ FETCH ALL RECORDS ----------------------------- #
     def fetch_all_records(self):
         """List all records in database"""
-        # Return a list of tuples from treeview
-        items = self.tree.get_children()
-
-        # Iterate through list to delete all items in the treeview
-        for item in items:
-            self.tree.delete(item)
-
-        # Query to get all contacts
-        # sorted by last name in desc (descending) order
-        # Get all records as a list of tuples
-        records = self.db_op.fetch_all_records()
-
-        # Insert all records into tree
-        # Unpack the records tuple into variables one item at a time
-        try:
-            for id, first_name, last_name, phone, email in records:
-                self.tree.insert("", 0, text=id, values=(
-                    id, first_name, last_name, phone, email)
-                )
-        except:
-            # When the database file is created for the first time
-            # it doesn't contain records and causes an exception
-            pass
+        # Count the records and show the rows at the current position
+        # Only the visible rows are read from the database
+        self.view.refresh()
 
 # ----------------------- ON TREE SELECT --------------------------------- #
     def on_tree_select(self, event):
@@ -179,19 +167,21 @@ class AddressBook:
             phone = self.entry_phone.get()
             email = self.entry_email.get()
 
-            # Execute query against SQLite database
-            self.db_op.update_record(first_name, last_name, phone, email, id)
+            def updated(record):
+                # Give the user the status of the operation
+                if record is not None:
+                    self.lbl_status.configure(
+                        text=f"{first_name} {last_name} "
+                        "was successfully updated.")
+
+            # Execute query against SQLite database on the worker thread,
+            # the treeview moves just the edited record when it's done
+            self.view.update_record(
+                first_name, last_name, phone, email, id, callback=updated)
 
             # Clear entry widgets, set focus to name entry widget
             self.clear_entry_widgets()
 
-            # Display all records in treeview
-            self.fetch_all_records()
-
-            # Give the user the status of the operation
-            self.lbl_status.configure(
-                text=f"{first_name} {last_name} was successfully updated.")
-
         except:
             self.lbl_status.configure(
                 text="Please select a record to modify")
@@ -207,8 +197,17 @@ class AddressBook:
             # selected item/values in the treelist
             id = (self.selected_values[0])
 
-            # Execute the query against the SQLite database
-            self.db_op.delete_record(id)
+            # Confirm to the user that the record was deleted
+            status = f"{self.selected_values[1]} "
+            status += f"{self.selected_values[2]} was successfully deleted."
+
+            def deleted(deleted_id):
+                if deleted_id is not None:
+                    self.lbl_status.configure(text=status)
+
+            # Execute the query against the SQLite database on the worker
+            # thread, the treeview removes just the deleted record
+            self.view.delete_record(id, callback=deleted)
 
             # Clear the Entry widgets
             self.clear_entry_widgets()
@@ -216,14 +215,6 @@ class AddressBook:
             # Set the focus
             self.entry_fname.focus()
 
-            # List all records
-            self.fetch_all_records()
-
-            # Confirm to the user that the record was deleted
-            status = f"{self.selected_values[1]} "
-            status += f"{self.selected_values[2]} was successfully deleted."
-            self.lbl_status.configure(text=status)
-
         except:
             self.lbl_status.configure(text="Select a record to delete")
 
@@ -357,12 +348,16 @@ class AddressBook:
         # Create scrollbar for treeview
         self.scrollbar = Scrollbar(
             self.treeview_frame,
-            orient="vertical",
-            command=self.tree.yview
+            orient="vertical"
         )
 
-        # Set scroll bar to scroll vertically and attach to the tree
-        self.tree.configure(yscroll=self.scrollbar.set)
+        # The virtual list pages records in from the database as the
+        # scrollbar moves, only the visible rows are treeview items
+        # Database calls run on a worker thread so a slow disk or a
+        # locked database doesn't freeze the window
+        self.worker = DBWorker(self.root, self.lbl_status)
+        self.view = VirtualTreeview(
+            self.tree, self.scrollbar, self.db_op, worker=self.worker)
 
         # Grid scrollbar just to the right of the tree
         # sn (SouthNorth) expands scrollbar to height of tree
@@ -382,6 +377,10 @@ class AddressBook:
 
 # -------------------------- CLOSE PROGRAM ------------------------------- #
     def close(self):
+        # Finish the running database call, then close
+        # the pooled database connections
+        self.worker.shutdown()
+        self.db_op.close()
         self.root.destroy()
 
 
@@ -13,6 +13,10 @@ import ttkbootstrap as ttk
 from ttkbootstrap.constants import *
 # Database operations library
 import db_operations
+# Virtual list mode for the treeview
+from virtual_treeview import VirtualTreeview
+# Run database calls on a worker thread
+from db_worker import DBWorker
 from address_book_png import icon_data_16
 from address_book_png import icon_data_32
 
@@ -90,13 +94,20 @@ class AddressBook:
             self.lbl_status.configure(text="Please fill out all entries")
         else:
             try:
-                # Insert record into database
-                self.db_op.insert_record(first_name, last_name, phone, email)
-
-                # Let the user know the add record was successful
-                self.lbl_status.configure(
-                    text=f"{first_name} {last_name} was successfully added."
-                )
+                def added(record):
+                    # Let the user know the add record was successful
+                    if record is not None:
+                        self.lbl_status.configure(
+                            text=f"{first_name} {last_name} "
+                            "was successfully added."
+                        )
+                    else:
+                        self.lbl_status.configure(text="Error")
+
+                # Insert record into database on the worker thread,
+                # the treeview adds just the new record when it's done
+                self.view.insert_record(
+                    first_name, last_name, phone, email, callback=added)
             except:
                 self.lbl_status.configure(
                     text=f"Error"
@@ -105,44 +116,46 @@ class AddressBook:
         # Clear the entry widgets
         self.clear_entry_widgets()
 
-        # Display all records in treeview
-        self.fetch_all_records()
-
         # Set focus to entry widget for next entry
         self.entry_fname.focus()
 
 # ------------------------ FETCH ALL RECORDS ----------------------------- #
     def fetch_all_records(self):
         """List all records in database"""
-        # Return a list of tuples from treeview
-        items = self.tree.get_children()
-
-        # Iterate through list to delete all items in the treeview
-        for item in items:
-            self.tree.delete(item)
-
-        # Query to get all contacts
-        # sorted by last name in desc (descending) order
-        # Get all records as a list of tuples
-        records = self.db_op.fetch_all_records()
-
-        # Insert all records into tree
-        # Unpack the records tuple into variables one item at a time
-        try:
-            for id, first_name, last_name, phone, email in records:
-                self.tree.insert("", 0, text=id, values=(
-                    id, first_name, last_name, phone, email)
-                )
-        except:
-            pass
+        # Count the records and show the rows at the current position
+        # Only the visible rows are read from the database
+        self.view.refresh()
+
+# ------------------------ FILTER RECORDS -------------------------------- #
+    def filter_records(self, field, text):
+        """Show only the records where field starts with the typed text"""
+        # Ignore keys that don't change the text, like Tab or arrows
+        if text == self.filter_text:
+            return
+        self.filter_text = text
+
+        # Show the whole list again when the entry is cleared
+        if not text:
+            self.worker.cancel("filter")
+            self.fetch_all_records()
+            return
+
+        # Show the top matches instead of the whole list
+        # Each keystroke supersedes the search for the one before
+        self.worker.submit(
+            self.db_op.prefix_search, field, text, 50,
+            callback=self.view.show_records,
+            key="filter"
+        )
 
 # ----------------------- ON TREE SELECT --------------------------------- #
     def on_tree_select(self, event):
         """When a record is selected, the values are inserted into
            the appropriate entry boxes for modification."""
         try:
-            # Clear entry widgets
-            self.clear_entry_widgets()
+            # Clear entry widgets, keeping the filtered list
+            # the record was selected from
+            self.clear_entry_widgets(show_all=False)
 
             # Get the selected (focus) item from the tree
             self.selected = self.tree.focus()
@@ -179,19 +192,21 @@ class AddressBook:
             phone = self.entry_phone.get()
             email = self.entry_email.get()
 
-            # Execute query against SQLite database
-            self.db_op.update_record(first_name, last_name, phone, email, id)
+            def updated(record):
+                # Give the user the status of the operation
+                if record is not None:
+                    self.lbl_status.configure(
+                        text=f"{first_name} {last_name} "
+                        "was successfully updated.")
+
+            # Execute query against SQLite database on the worker thread,
+            # the treeview moves just the edited record when it's done
+            self.view.update_record(
+                first_name, last_name, phone, email, id, callback=updated)
 
             # Clear entry widgets
             self.clear_entry_widgets()
 
-            # Display all records in treeview
-            self.fetch_all_records()
-
-            # Give the user the status of the operation
-            self.lbl_status.configure(
-                text=f"{first_name} {last_name} was successfully updated.")
-
         except:
             self.lbl_status.configure(
                 text="Please select a record to modify")
@@ -207,8 +222,17 @@ class AddressBook:
             # selected item/values in the treelist
             id = (self.selected_values[0])
 
-            # Execute the query against the SQLite database
-            self.db_op.delete_record(id)
+            # Confirm to the user that the record was deleted
+            status = f"{self.selected_values[1]} "
+            status += f"{self.selected_values[2]} was successfully deleted."
+
+            def deleted(deleted_id):
+                if deleted_id is not None:
+                    self.lbl_status.configure(text=status)
+
+            # Execute the query against the SQLite database on the worker
+            # thread, the treeview removes just the deleted record
+            self.view.delete_record(id, callback=deleted)
 
             # Clear the Entry widgets
             self.clear_entry_widgets()
@@ -216,14 +240,6 @@ class AddressBook:
             # Set the focus
             self.entry_fname.focus()
 
-            # List all records
-            self.fetch_all_records()
-
-            # Confirm to the user that the record was deleted
-            status = f"{self.selected_values[1]} "
-            status += f"{self.selected_values[2]} was successfully deleted."
-            self.lbl_status.configure(text=status)
-
         except:
             self.lbl_status.configure(text="Select a record to delete")
 
@@ -270,6 +286,19 @@ class AddressBook:
         self.entry_phone = ttk.Entry(self.entry_frame, width=30)
         self.entry_email = ttk.Entry(self.entry_frame, width=30)
 
+        # Filter the contact list as the user types a name or email
+        self.filter_text = ""
+        for entry, field in (
+            (self.entry_fname, "first_name"),
+            (self.entry_lname, "last_name"),
+            (self.entry_email, "email"),
+        ):
+            entry.bind(
+                "<KeyRelease>",
+                lambda event, field=field: self.filter_records(
+                    field, event.widget.get())
+            )
+
         # ------------------------ CREATE BUTTONS ------------------------ #
         self.btn_add = ttk.Button(
             self.operations_frame,
@@ -379,11 +408,15 @@ class AddressBook:
         self.scrollbar = ttk.Scrollbar(
             self.treeview_frame,  # Parent frame for the scrollbar
             orient="vertical",  # Scrollbar orientation
-            command=self.tree.yview  # Command to scroll the treeview vertically
         )
 
-        # Configure the treeview to work with the scrollbar
-        self.tree.configure(yscroll=self.scrollbar.set)
+        # The virtual list pages records in from the database as the
+        # scrollbar moves, only the visible rows are treeview items
+        # Database calls run on a worker thread so a slow disk or a
+        # locked database doesn't freeze the window
+        self.worker = DBWorker(self.root, self.lbl_status)
+        self.view = VirtualTreeview(
+            self.tree, self.scrollbar, self.db_op, worker=self.worker)
 
         # Place the scrollbar next to the treeview (right side) and make it stretch vertically
         self.scrollbar.grid(row=0, column=1, sticky="sn")
@@ -396,23 +429,9 @@ class AddressBook:
     def sort_treeview(self, column, descending):
         # Function to sort the Treeview by the specified column.
 
-        # Extract the data from the Treeview.
-        # For each item in the Treeview, get the value associated with the
-        # specified column. This creates a list of tuples, where each
-        # tuple contains the column value and the item (Treeview row).
-        data = [(self.tree.set(item, column), item)
-                for item in self.tree.get_children('')]
-
-        # Sort the list of tuples based on the column values.
-        # 'reverse=descending' determines the order of sorting
-        # (ascending or descending).
-        data.sort(reverse=descending)
-
-        # Rearrange the items in the Treeview to reflect the sorted order.
-        # 'enumerate' provides an index, which is used to set the
-        # new position for each item.
-        for index, (val, item) in enumerate(data):
-            self.tree.move(item, '', index)
+        # The virtual list sorts in the database and shows
+        # the first rows in the new order
+        self.view.set_order(column, "desc" if descending else "asc")
 
         # Update the column heading to allow toggling between
         # ascending and descending order for the next click.
@@ -421,16 +440,25 @@ class AddressBook:
         )
 
 # --------------------- CLEAR ENTRY WIDGETS ------------------------------ #
-    def clear_entry_widgets(self):
+    def clear_entry_widgets(self, show_all: bool = True):
         # Clear entry widgets, set focus to name entry widget
         self.entry_fname.delete(0, END)
         self.entry_lname.delete(0, END)
         self.entry_phone.delete(0, END)
         self.entry_email.delete(0, END)
         self.entry_fname.focus()
+        # Go back from a filtered list to every record
+        if show_all and self.filter_text:
+            self.filter_text = ""
+            self.worker.cancel("filter")
+            self.view.refresh()
 
 # -------------------------- CLOSE PROGRAM ------------------------------- #
     def close(self):
+        # Finish the running database call, then close
+        # the pooled database connections
+        self.worker.shutdown()
+        self.db_op.close()
         self.root.destroy()
 
 
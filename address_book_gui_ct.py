@@ -6,6 +6,7 @@
     This is the view, the user interace
 """
 from base64 import b64decode
+from itertools import islice
 # # Import tkinter library
 from tkinter import PhotoImage
 from tkinter.ttk import Treeview, Style
@@ -15,6 +16,8 @@ from tkinter.ttk import Treeview, Style
 import customtkinter as ct
 # Database operations library
 import db_operations
+# Run database calls on a worker thread
+from db_worker import DBWorker
 from address_book_png import icon_data_16
 from address_book_png import icon_data_32
 
@@ -30,6 +33,9 @@ class AddressBook(ct.CTk):
         and starts the main Tkinter program loop.
         """
         super().__init__()
+        # Generator for a contact list that is still loading
+        self.records = None
+
         # Create the database controller object
         # If the database doesn't exist, it is created
         self.db_op = db_operations.DBOperations("address_book.db")
@@ -40,6 +46,10 @@ class AddressBook(ct.CTk):
         # Initialize Tkinter GUI
         self.init_gui()
 
+        # Database calls run on a worker thread so a slow disk or a
+        # locked database doesn't freeze the window
+        self.worker = DBWorker(self, self.lbl_status)
+
         # List the existing records to show on startup
         self.fetch_all_records()
 
@@ -94,13 +104,21 @@ class AddressBook(ct.CTk):
             self.lbl_status.configure(text="Please fill out all entries")
         else:
             try:
-                # Insert record into database
-                self.db_op.insert_record(first_name, last_name, phone, email)
-
-                # Let the user know the add record was successful
-                self.lbl_status.configure(
-                    text=f"{first_name} {last_name} was successfully added."
-                )
+                def added(record):
+                    # Let the user know the add record was successful
+                    if record is not None:
+                        self.lbl_status.configure(
+                            text=f"{first_name} {last_name} "
+                            "was successfully added."
+                        )
+                    else:
+                        self.lbl_status.configure(text="Error")
+
+                # Insert record into database on the worker thread,
+                # the treeview adds just the new record when it's done
+                self.save_record(
+                    added, self.db_op.insert_record,
+                    first_name, last_name, phone, email)
             except:
                 self.lbl_status.configure(
                     text=f"Error"
@@ -109,15 +127,15 @@ class AddressBook(ct.CTk):
         # Clear the entry widgets
         self.clear_entry_widgets()
 
-        # Display all records in treeview
-        self.fetch_all_records()
-
         # Set focus to entry widget for next entry
         self.entry_fname.focus()
 
 # ------------------------ FETCH ALL RECORDS ----------------------------- #
     def fetch_all_records(self):
         """List all records in database"""
+        # Stop loading the previous list if it is still streaming in
+        self.stop_loading()
+
         # Return a list of tuples from treeview
         items = self.tree.get_children()
 
@@ -125,22 +143,81 @@ class AddressBook(ct.CTk):
         for item in items:
             self.tree.delete(item)
 
-        # Query to get all contacts
-        # sorted by last name in desc (descending) order
-        # Get all records as a list of tuples
-        records = self.db_op.fetch_all_records()
+        # Query to get all contacts sorted by last name
+        # Records are streamed from the database a chunk at a time
+        self.records = self.db_op.iter_records("last_name")
+        self.load_next_chunk()
+
+# ------------------------ LOAD NEXT CHUNK ------------------------------- #
+    def load_next_chunk(self):
+        """Read the next chunk of records on the worker thread"""
+        # Take the next chunk of records from the generator
+        self.worker.submit(
+            lambda records: list(islice(records, 500)), self.records,
+            callback=self.insert_chunk,
+            key="list"
+        )
 
-        # Insert all records into tree
+    def insert_chunk(self, chunk):
+        """Insert a chunk of records, then read the next one"""
+        # Insert the chunk into the tree
         # Unpack the records tuple into variables one item at a time
-        try:
-            for id, first_name, last_name, phone, email in records:
-                self.tree.insert("", 0, text=id, values=(
-                    id, first_name, last_name, phone, email)
-                )
-        except:
-            # When the database file is created for the first time
-            # it doesn't contain records and causes an exception
-            pass
+        # The item id is the record id so an edit can find its item
+        for id, first_name, last_name, phone, email in chunk:
+            self.tree.insert("", ct.END, iid=id, text=id, values=(
+                id, first_name, last_name, phone, email)
+            )
+
+        if chunk:
+            # Tk redraws this chunk while the worker reads the next one
+            self.load_next_chunk()
+        else:
+            # All records are loaded
+            self.records = None
+
+# ------------------------ STOP LOADING ---------------------------------- #
+    def stop_loading(self):
+        """Cancel a list that is still loading"""
+        if self.records is not None:
+            self.worker.cancel("list")
+            # Closing the generator returns its database connection
+            # Close it on the worker thread, it may be reading a chunk
+            self.worker.submit(self.records.close)
+            self.records = None
+
+# -------------------------- SAVE RECORD --------------------------------- #
+    def save_record(self, callback, function, *args):
+        """Run a database write on the worker thread, then put the
+           changed record in its sorted place instead of reloading"""
+        def write():
+            result = function(*args)
+            position = None
+            # Insert and update return the record, delete the id
+            if isinstance(result, tuple):
+                # Row number in the last name order the list is loaded in
+                position = self.db_op.record_position(result, "last_name")
+            return result, position
+
+        def written(saved):
+            result, position = saved
+            if result is not None:
+                self.show_record(result, position)
+            callback(result)
+
+        self.worker.submit(write, callback=written)
+
+    def show_record(self, result, position):
+        """Move, add or remove one record's treeview item"""
+        if self.records is not None:
+            # Still loading, the rest of the list isn't in the tree yet
+            self.fetch_all_records()
+            return
+
+        id = result[0] if isinstance(result, tuple) else result
+        if self.tree.exists(id):
+            self.tree.delete(id)
+        if position is not None:
+            self.tree.insert("", position, iid=id, text=id, values=result)
 
 # ----------------------- ON TREE SELECT --------------------------------- #
     def on_tree_select(self, event):
@@ -185,19 +262,22 @@ class AddressBook(ct.CTk):
             phone = self.entry_phone.get()
             email = self.entry_email.get()
 
-            # Execute query against SQLite database
-            self.db_op.update_record(first_name, last_name, phone, email, id)
+            def updated(record):
+                # Give the user the status of the operation
+                if record is not None:
+                    self.lbl_status.configure(
+                        text=f"{first_name} {last_name} "
+                        "was successfully updated.")
+
+            # Execute query against SQLite database on the worker thread,
+            # the treeview moves just the edited record when it's done
+            self.save_record(
+                updated, self.db_op.update_record,
+                first_name, last_name, phone, email, id)
 
             # Clear entry widgets, set focus to name entry widget
             self.clear_entry_widgets()
 
-            # Display all records in treeview
-            self.fetch_all_records()
-
-            # Give the user the status of the operation
-            self.lbl_status.configure(
-                text=f"{first_name} {last_name} was successfully updated.")
-
         except:
             self.lbl_status.configure(
                 text="Please select a record to modify")
@@ -213,8 +293,17 @@ class AddressBook(ct.CTk):
             # selected item/values in the treelist
             id = (self.selected_values[0])
 
-            # Execute the query against the SQLite database
-            self.db_op.delete_record(id)
+            # Confirm to the user that the record was deleted
+            status = f"{self.selected_values[1]} "
+            status += f"{self.selected_values[2]} was successfully deleted."
+
+            def deleted(deleted_id):
+                if deleted_id is not None:
+                    self.lbl_status.configure(text=status)
+
+            # Execute the query against the SQLite database on the worker
+            # thread, the treeview removes just the deleted record
+            self.save_record(deleted, self.db_op.delete_record, id)
 
             # Clear the Entry widgets
             self.clear_entry_widgets()
@@ -222,14 +311,6 @@ class AddressBook(ct.CTk):
             # Set the focus
             self.entry_fname.focus()
 
-            # List all records
-            self.fetch_all_records()
-
-            # Confirm to the user that the record was deleted
-            status = f"{self.selected_values[1]} "
-            status += f"{self.selected_values[2]} was successfully deleted."
-            self.lbl_status.configure(text=status)
-
         except:
             self.lbl_status.configure(text="Select a record to delete")
 
@@ -404,6 +485,13 @@ class AddressBook(ct.CTk):
 
 # -------------------------- CLOSE PROGRAM ------------------------------- #
     def close(self):
+        # Finish the running database call first
+        self.worker.shutdown()
+        if self.records is not None:
+            # The worker has stopped, close a list still loading here
+            self.records.close()
+        # Close the pooled database connections
+        self.db_op.close()
         self.destroy()
 
 
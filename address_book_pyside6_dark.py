@@ -7,7 +7,7 @@
 from PySide6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QLabel,
     QLineEdit, QPushButton, QVBoxLayout, QHBoxLayout, QGridLayout,
-    QTreeWidget, QTreeWidgetItem, QGroupBox, QMessageBox
+    QTreeView, QAbstractItemView, QGroupBox, QMessageBox
 )
 from PySide6.QtCore import QFile, Qt
 from PySide6.QtGui import QIcon, QPixmap, QImage
@@ -15,6 +15,10 @@ import sys
 import base64
 from address_book_png import icon_data_16
 import db_operations
+# Lazy loading table model for the contact list
+from contact_table_model import ContactTableModel
+# Run database calls on a worker thread
+from qt_db_worker import QtDBWorker
 
 
 class AddressBook(QMainWindow):
@@ -95,6 +99,16 @@ class AddressBook(QMainWindow):
             entry_layout.addWidget(entry, i, 1)
             self.entries[label_text.lower().replace(":", "")] = entry
 
+        # Filter the contact list as the user types a name or email
+        # textEdited is only sent for typing, not for setText()
+        for key, field in (
+            ("first name", "first_name"),
+            ("last name", "last_name"),
+            ("email", "email"),
+        ):
+            self.entries[key].textEdited.connect(
+                lambda text, field=field: self.filter_records(field, text))
+
         self.status_label = QLabel("")
         entry_layout.addWidget(self.status_label, len(labels), 0, 1, 2)
         self.entry_frame.setLayout(entry_layout)
@@ -128,9 +142,22 @@ class AddressBook(QMainWindow):
         self.treeview_frame = QGroupBox("Contact List")
         treeview_layout = QVBoxLayout()
 
-        self.tree = QTreeWidget()
-        self.tree.setHeaderLabels(
-            ["ID", "First Name", "Last Name", "Phone", "Email"])
+        # The model fetches records from the database a page at a time
+        # as the view scrolls, and sorts in SQL
+        # Database calls run on a worker thread so a slow disk or a
+        # locked database doesn't freeze the window
+        self.worker = QtDBWorker(self.status_label, self)
+        self.model = ContactTableModel(self.db_op, worker=self.worker)
+        self.model.sort(self.sort_column, self.sort_order)
+
+        self.tree = QTreeView()
+        self.tree.setModel(self.model)
+        # A flat table, every row the same height so Qt doesn't
+        # have to measure each row
+        self.tree.setRootIsDecorated(False)
+        self.tree.setUniformRowHeights(True)
+        self.tree.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.tree.setSelectionMode(QAbstractItemView.SingleSelection)
 
         # Set column widths
         self.tree.setColumnWidth(0, 40)
@@ -139,17 +166,18 @@ class AddressBook(QMainWindow):
         self.tree.setColumnWidth(3, 150)
         self.tree.setColumnWidth(4, 250)
 
-        # Enable sorting
-        self.tree.setSortingEnabled(True)
-
-        # Set the default sort order
-        self.tree.sortByColumn(self.sort_column, self.sort_order)
+        # Clicking a column heading sorts by that column in SQL
+        header = self.tree.header()
+        header.setSectionsClickable(True)
+        header.setSortIndicatorShown(True)
+        header.setSortIndicator(self.sort_column, self.sort_order)
 
         # Connect sorting signal
-        self.tree.header().sortIndicatorChanged.connect(self.on_sort_column_changed)
+        header.sortIndicatorChanged.connect(self.on_sort_column_changed)
 
         # Connect selection change signal
-        self.tree.itemSelectionChanged.connect(self.on_tree_select)
+        self.tree.selectionModel().selectionChanged.connect(
+            self.on_tree_select)
 
         # Add tree to layout
         treeview_layout.addWidget(self.tree)
@@ -160,28 +188,8 @@ class AddressBook(QMainWindow):
         """Handle column sort indicator changes"""
         self.sort_column = logical_index
         self.sort_order = order
-        self.custom_sort()
-
-# --------------------------- CUSTOM SORT -------------------------------- #
-    def custom_sort(self):
-        """Custom sorting implementation"""
-        self.tree.sortItems(self.sort_column, self.sort_order)
-
-        # Special handling for ID column to sort numerically
-        if self.sort_column == 0:
-            item_list = []
-            while self.tree.topLevelItemCount() > 0:
-                item_list.append(self.tree.takeTopLevelItem(0))
-
-            # Sort based on numeric ID
-            item_list.sort(
-                key=lambda x: int(x.text(0)),
-                reverse=(self.sort_order == Qt.DescendingOrder)
-            )
-
-            # Add items back to tree
-            for item in item_list:
-                self.tree.addTopLevelItem(item)
+        # Sort in the database, ties broken by id
+        self.model.sort(logical_index, order)
 
 # -------------------------- INSERT RECORD ------------------------------- #
     def insert_record(self):
@@ -198,12 +206,18 @@ class AddressBook(QMainWindow):
             self.status_label.setText("Please fill out all entries")
             return
 
+        def added(record):
+            if record is not None:
+                self.status_label.setText(
+                    f"{first_name} {last_name} was successfully added.")
+            else:
+                self.status_label.setText("Error")
+
         try:
-            self.db_op.insert_record(first_name, last_name, phone, email)
-            self.status_label.setText(
-                f"{first_name} {last_name} was successfully added.")
+            # Insert on the worker thread, the model adds just the new row
+            self.model.insert_record(
+                first_name, last_name, phone, email, callback=added)
             self.clear_entry_widgets()
-            self.fetch_all_records()
         except Exception as e:
             self.status_label.setText(f"Error: {str(e)}")
 
@@ -212,41 +226,29 @@ class AddressBook(QMainWindow):
 # ----------------------- FETCH ALL RECORDS ------------------------------ #
     def fetch_all_records(self):
         """List all records in database"""
-        # Temporarily disable sorting while updating
-        self.tree.setSortingEnabled(False)
-        self.tree.clear()
-
-        records = self.db_op.fetch_all_records()
+        # Start again from the first page, the view fetches
+        # more pages as it is scrolled
+        self.model.set_filter(None)
 
-        # Insert all records into tree
-        # Unpack the records tuple into variables one item at a time
-        try:
-            for id, first_name, last_name, phone, email in records:
-                item = QTreeWidgetItem(
-                    [str(id), first_name, last_name, phone, email])
-                # Make ID column sort numerically
-                item.setData(0, Qt.UserRole, id)
-                self.tree.addTopLevelItem(item)
-        except:
-            # When the database file is created for the first time
-            # it doesn't contain records and causes an exception
-            pass
-
-        # Re-enable sorting and apply current sort
-        self.tree.setSortingEnabled(True)
-        self.tree.sortByColumn(self.sort_column, self.sort_order)
+# ------------------------- FILTER RECORDS ------------------------------- #
+    def filter_records(self, field, text):
+        """Show only the records where field starts with the typed text"""
+        # An empty entry shows the whole list again
+        self.model.set_filter(field, text)
 
 # ------------------------- ON TREE SELECT ------------------------------- #
     def on_tree_select(self):
         """When a record is selected, insert values into entry boxes"""
-        self.clear_entry_widgets()
+        # Keep the filtered list the record was selected from
+        self.clear_entry_widgets(show_all=False)
 
-        selected_items = self.tree.selectedItems()
-        if not selected_items:
+        selected_rows = self.tree.selectionModel().selectedRows()
+        if not selected_rows:
             return
 
-        item = selected_items[0]
-        self.selected_values = [item.text(i) for i in range(5)]
+        record = self.model.record(selected_rows[0].row())
+        self.selected_values = [
+            "" if value is None else str(value) for value in record]
 
         self.entries["first name"].setText(self.selected_values[1])
         self.entries["last name"].setText(self.selected_values[2])
@@ -263,12 +265,17 @@ class AddressBook(QMainWindow):
             phone = self.entries["phone"].text()
             email = self.entries["email"].text()
 
-            self.db_op.update_record(first_name, last_name, phone, email, id)
-            self.clear_entry_widgets()
-            self.fetch_all_records()
+            def updated(record):
+                if record is not None:
+                    self.status_label.setText(
+                        f"{first_name} {last_name} was successfully updated.")
 
-            self.status_label.setText(
-                f"{first_name} {last_name} was successfully updated.")
+            # Clear the selection first so it doesn't jump to the next row
+            # when the model moves just the edited row
+            self.tree.selectionModel().clear()
+            self.model.update_record(
+                first_name, last_name, phone, email, id, callback=updated)
+            self.clear_entry_widgets()
         except AttributeError:
             self.status_label.setText("Please select a record to modify")
 
@@ -288,23 +295,42 @@ class AddressBook(QMainWindow):
             )
 
             if reply == QMessageBox.Yes:
-                self.db_op.delete_record(id)
-                self.clear_entry_widgets()
-                self.fetch_all_records()
-
                 status = f"{self.selected_values[1]} {
                     self.selected_values[2]} "
                 status += "was successfully deleted."
-                self.status_label.setText(status)
+
+                def deleted(deleted_id):
+                    if deleted_id is not None:
+                        self.status_label.setText(status)
+
+                # Clear the selection first so it doesn't jump to the
+                # next row when the model removes just the deleted row
+                self.tree.selectionModel().clear()
+                self.model.delete_record(id, callback=deleted)
+                self.clear_entry_widgets()
         except AttributeError:
             self.status_label.setText("Select a record to delete")
 
+# --------------------------- CLOSE EVENT -------------------------------- #
+    def closeEvent(self, event):
+        """Close the pooled database connections with the window"""
+        # Detach the model first so the view stops fetching pages
+        self.tree.setModel(None)
+        # Finish the running database call, then close
+        self.worker.shutdown()
+        self.db_op.close()
+        super().closeEvent(event)
+
 # ---------------------- CLEAR ENTRY WIDGETS ----------------------------- #
-    def clear_entry_widgets(self):
-        """Clear all entry widgets"""
+    def clear_entry_widgets(self, show_all: bool = True):
+        """Clear all entry widgets, show_all also goes back from
+           a filtered list to every record"""
         for entry in self.entries.values():
             entry.clear()
         self.entries["first name"].setFocus()
+        # clear() doesn't send textEdited, so the filter is reset here
+        if show_all and self.model.filter is not None:
+            self.model.set_filter(None)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,239 @@
+"""
+    Name: async_db_operations.py
+    asyncio version of DBOperations
+    Every call runs on one dedicated database thread, so a coroutine
+    awaiting a query never blocks the event loop. Requests wait in a
+    bounded queue, callers wait for a free slot when it is full, and
+    identical reads already waiting are answered by one query.
+    Usage: python async_db_operations.py
+"""
+import asyncio
+import queue
+import threading
+import time
+import db_operations
+
+# Requests allowed to wait for the database thread at a time,
+# a caller awaits a free slot when they are all taken
+MAX_PENDING = 100
+
+
+class AsyncDBOperations:
+    """Coroutine methods that run DBOperations calls on a database thread"""
+
+    def __init__(
+        self,
+        database: str,
+        max_pending: int = MAX_PENDING,
+        pool_size: int = 5,
+        pragmas: dict = None
+    ):
+        # The blocking DBOperations, only used on the database thread
+        self.db_op = db_operations.DBOperations(database, pool_size, pragmas)
+        self.max_pending = max_pending
+        # (future, function, args) waiting for the database thread
+        # None tells the thread to stop
+        self.requests = queue.Queue(maxsize=max_pending)
+        # Free places in the queue, created on the event loop
+        self.slots = None
+        # Reads waiting or running, by (name, args), so the same
+        # read asked for again shares the first one's result
+        self.reads = {}
+        # Number of reads answered by a read already waiting
+        self.coalesced = 0
+        # Tasks queueing shared reads, kept so they aren't
+        # garbage collected while they wait for a slot
+        self.queueing = set()
+        self.closed = False
+
+        self.thread = threading.Thread(
+            target=self.run, name="async_db_operations", daemon=True)
+        self.thread.start()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+# ------------------------- DATABASE THREAD ------------------------------ #
+    def run(self):
+        """Database thread, run requests in the order they were queued"""
+        while True:
+            request = self.requests.get()
+            if request is None:
+                break
+            future, function, args = request
+            try:
+                result = function(*args)
+            except Exception as e:
+                self.finish_soon(future, None, e)
+            else:
+                self.finish_soon(future, result, None)
+
+    def finish_soon(self, future, result, exception):
+        """Database thread, hand a result back to the future's loop"""
+        try:
+            future.get_loop().call_soon_threadsafe(
+                self.finish, future, result, exception)
+        except RuntimeError:
+            # The event loop was closed while the query ran
+            pass
+
+    def finish(self, future, result, exception):
+        """Event loop, free the slot and set the result"""
+        self.slots.release()
+        # The caller may have given up (cancelled) while waiting
+        if not future.done():
+            if exception is not None:
+                future.set_exception(exception)
+            else:
+                future.set_result(result)
+
+# ----------------------------- REQUESTS --------------------------------- #
+    async def submit(self, function, *args):
+        """Queue a call for the database thread and await its result
+           Waits for a free slot first when max_pending are queued"""
+        future = asyncio.get_running_loop().create_future()
+        await self.enqueue(future, function, args)
+        return future
+
+    async def enqueue(self, future, function, args: tuple):
+        """Wait for a free slot, then queue a call whose result
+           is set on future"""
+        if self.closed:
+            raise RuntimeError("AsyncDBOperations is closed")
+        if self.slots is None:
+            self.slots = asyncio.Semaphore(self.max_pending)
+        await self.slots.acquire()
+        # Never blocks, the semaphore keeps the queue from filling
+        self.requests.put_nowait((future, function, args))
+
+    async def write(self, function, *args):
+        """Run a call that changes the database"""
+        # A read queued before this write would miss the change,
+        # reads asked for from now on need a query of their own
+        self.reads.clear()
+        return await (await self.submit(function, *args))
+
+    async def read(self, function, *args):
+        """Run a call that only reads, sharing the result of the
+           same read if one is already waiting for the thread"""
+        key = (function.__name__, args)
+        future = self.reads.get(key)
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            # Shared from now, not once it has a slot, so the same
+            # read asked for while this one waits doesn't queue again
+            self.reads[key] = future
+            # A task waits for the slot, the caller being cancelled
+            # must not stop the read the others are sharing
+            task = asyncio.ensure_future(
+                self.queue_read(key, future, function, args))
+            self.queueing.add(task)
+            task.add_done_callback(self.queueing.discard)
+        else:
+            self.coalesced += 1
+        # One caller being cancelled must not cancel the shared read
+        return await asyncio.shield(future)
+
+    async def queue_read(self, key: tuple, future, function, args: tuple):
+        """Queue a shared read and stop sharing it once it is done"""
+        try:
+            await self.enqueue(future, function, args)
+            await future
+        except asyncio.CancelledError:
+            # The event loop is shutting down
+            future.cancel()
+            raise
+        except Exception as e:
+            # Not queued, the callers sharing it get the error
+            if not future.done():
+                future.set_exception(e)
+        finally:
+            # A write may have cleared it and a newer read taken its key
+            if self.reads.get(key) is future:
+                del self.reads[key]
+
+# ------------------------------ METHODS --------------------------------- #
+    async def create_table(self):
+        """Create database and table if not exists"""
+        await self.write(self.db_op.create_table)
+
+    async def insert_record(
+        self,
+        first_name: str,
+        last_name: str,
+        phone: str,
+        email: str
+    ) -> tuple:
+        """Insert new record
+           Return the new (id, first_name, last_name, phone, email)
+           or None on error"""
+        return await self.write(
+            self.db_op.insert_record, first_name, last_name, phone, email)
+
+    async def fetch_all_records(self):
+        """Fetch all records
+           Callers asking at the same time get the same list,
+           don't change it"""
+        return await self.read(self.db_op.fetch_all_records)
+
+    async def update_record(
+        self,
+        first_name: str,
+        last_name: str,
+        phone: str,
+        email: str,
+        id: int
+    ) -> tuple:
+        """Update selected record by id
+           Return the updated record or None if there was no record"""
+        return await self.write(
+            self.db_op.update_record, first_name, last_name, phone, email, id)
+
+    async def delete_record(self, id: int) -> int:
+        """Delete selected record by id
+           Return the id deleted, or None if there was no record"""
+        return await self.write(self.db_op.delete_record, id)
+
+    async def database_dump(self):
+        """Dump the database to database_dump.sql"""
+        await self.read(self.db_op.database_dump)
+
+# ------------------------------- CLOSE ---------------------------------- #
+    async def close(self):
+        """Finish the queued requests, then close the connections"""
+        if self.closed:
+            return
+        self.closed = True
+        # Queued after every request already waiting
+        if self.slots is not None:
+            await self.slots.acquire()
+        self.requests.put_nowait(None)
+        await asyncio.get_running_loop().run_in_executor(
+            None, self.thread.join)
+        self.db_op.close()
+
+
+# ------------------------------ START ----------------------------------- #
+async def main():
+    async with AsyncDBOperations("address_book.db") as db:
+        await db.create_table()
+        record = await db.insert_record(
+            "Async", "Example", "555-0100", "async@example.com")
+        print(f"Inserted {record}")
+
+        # Ten callers at once share one query
+        start = time.perf_counter()
+        results = await asyncio.gather(
+            *(db.fetch_all_records() for _ in range(10)))
+        print(f"{len(results)} fetches of {len(results[0] or [])} records "
+              f"in {time.perf_counter() - start:.3f} s, "
+              f"{db.coalesced} answered by a shared query")
+
+        await db.delete_record(record[0])
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,362 @@
+"""
+    Name: benchmark.py
+    Performance checks for db_operations
+    Each benchmark builds a temporary database of made up contacts
+    Usage: python benchmark.py prefix --rows 1000000
+"""
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+import os
+import random
+import string
+import tempfile
+import time
+import tracemalloc
+from contact_store import ContactStore
+import db_operations
+import dedupe
+
+FIRST_NAMES = [
+    "William", "Mary", "James", "Patricia", "John", "Jennifer", "Robert",
+    "Linda", "Michael", "Elizabeth", "David", "Barbara", "Richard", "Susan",
+    "Joseph", "Jessica", "Thomas", "Sarah", "Charles", "Karen", "Kermit",
+]
+LAST_NAMES = [
+    "Smith", "Johnson", "Williams", "Brown", "Jones", "Garcia", "Miller",
+    "Davis", "Rodriguez", "Martinez", "Hernandez", "Lopez", "Gonzalez",
+    "Wilson", "Anderson", "Thomas", "Taylor", "Moore", "Jackson", "Loring",
+]
+DOMAINS = ["gmail.com", "yahoo.com", "outlook.com", "wncc.edu", "disney.com"]
+
+
+# ------------------------- MADE UP CONTACTS ----------------------------- #
+def random_contacts(rows: int, seed: int = 1):
+    """Generator of (first_name, last_name, phone, email) rows"""
+    generator = random.Random(seed)
+    for _ in range(rows):
+        first_name = generator.choice(FIRST_NAMES)
+        # A random suffix makes most last names unique
+        last_name = generator.choice(LAST_NAMES) + "".join(
+            generator.choices(string.ascii_lowercase, k=4))
+        phone = "{:03}.{:03}.{:04}".format(
+            generator.randrange(1000),
+            generator.randrange(1000),
+            generator.randrange(10000)
+        )
+        email = f"{first_name}.{last_name}@{generator.choice(DOMAINS)}"
+        yield first_name, last_name, phone, email.lower()
+
+
+def with_duplicates(
+    contacts,
+    percent: float,
+    seed: int = 3,
+    pairs: list = None
+):
+    """Repeat percent of the contacts with a typo in the last name
+       Half of the copies are entered without the phone and email,
+       so only the name links them. pairs gets (row, copy row,
+       name only) with rows counted from 0"""
+    generator = random.Random(seed)
+    row = 0
+    for contact in contacts:
+        yield contact
+        row += 1
+        if generator.random() * 100 < percent:
+            first_name, last_name, phone, email = contact
+            # Drop one letter of the last name
+            index = generator.randrange(len(last_name))
+            last_name = last_name[:index] + last_name[index + 1:]
+            name_only = generator.random() < 0.5
+            if name_only:
+                phone = ""
+                email = ""
+            if pairs is not None:
+                pairs.append((row - 1, row, name_only))
+            yield first_name, last_name, phone, email
+            row += 1
+
+
+def make_database(
+    folder: str,
+    rows: int,
+    contacts=None,
+    config: db_operations.DatabaseConfig = None
+) -> db_operations.DBOperations:
+    """Create a database with rows made up contacts in folder"""
+    db = db_operations.DBOperations(
+        os.path.join(folder, "benchmark.db"), config=config)
+    db.create_table()
+    start = time.perf_counter()
+    if contacts is None:
+        contacts = random_contacts(rows)
+    db.insert_many(contacts)
+    elapsed = time.perf_counter() - start
+    print(f"Inserted {rows:,} rows in {elapsed:.2f} s "
+          f"({rows / elapsed:,.0f} rows/s)")
+    return db
+
+
+@contextmanager
+def temporary_database(
+    rows: int,
+    contacts=None,
+    config: db_operations.DatabaseConfig = None
+):
+    """make_database() in a temporary folder, the database is closed
+       and the folder removed after the with block, a million rows
+       take hundreds of MB"""
+    with tempfile.TemporaryDirectory() as folder:
+        db = make_database(folder, rows, contacts, config)
+        try:
+            yield db
+        finally:
+            # The files must be closed before the folder is removed
+            db.close()
+
+
+def percentile(times: list, percent: float) -> float:
+    """Return the percent percentile of a list of times"""
+    times = sorted(times)
+    return times[min(len(times) - 1, int(len(times) * percent / 100))]
+
+
+# ------------------------- PREFIX SEARCH -------------------------------- #
+def benchmark_prefix(args) -> bool:
+    """Time as-you-type prefix searches, one search per keystroke"""
+    with temporary_database(args.rows) as db:
+        # The first search loads the prefix index
+        start = time.perf_counter()
+        db.prefix_search("last_name", "a")
+        print(f"Prefix index loaded in {time.perf_counter() - start:.2f} s")
+
+        # Type the first letters of names one keystroke at a time
+        generator = random.Random(2)
+        times = []
+        for _ in range(args.searches):
+            name = generator.choice(LAST_NAMES) + "".join(
+                generator.choices(string.ascii_lowercase, k=4))
+            for length in range(1, len(name) + 1):
+                start = time.perf_counter()
+                db.prefix_search("last_name", name[:length], 20)
+                times.append((time.perf_counter() - start) * 1000)
+
+    p50 = percentile(times, 50)
+    p99 = percentile(times, 99)
+    print(f"{len(times):,} keystrokes  p50 {p50:.2f} ms  "
+          f"p99 {p99:.2f} ms  max {max(times):.2f} ms")
+    # One frame at 60 frames per second is 16 ms
+    return p99 < 16
+
+
+# ------------------------- DUPLICATE CONTACTS --------------------------- #
+def benchmark_dedupe(args) -> bool:
+    """Time the duplicate finder on a book with known duplicates"""
+    duplicates = int(args.rows * args.percent / 100)
+    pairs = []
+    with temporary_database(
+        args.rows,
+        with_duplicates(
+            random_contacts(args.rows - duplicates),
+            args.percent * args.rows / (args.rows - duplicates),
+            pairs=pairs
+        )
+    ) as db:
+        start = time.perf_counter()
+        found = dedupe.find_duplicates(db, args.workers)
+        elapsed = time.perf_counter() - start
+
+        # A new table numbers the rows from id 1
+        suggested = {
+            (suggestion[3], suggestion[8])
+            for suggestion in db.fetch_merge_suggestions(limit=found)
+        }
+    print(f"{found:,} suggestions for {len(pairs):,} duplicates "
+          f"in {elapsed:.1f} s ({args.rows / elapsed:,.0f} rows/s)")
+    recall = {}
+    correct = 0
+    for name_only, label in ((False, "same phone and email"),
+                             (True, "name only")):
+        expected = [(row + 1, copy + 1)
+                    for row, copy, only in pairs if only == name_only]
+        found_pairs = sum(pair in suggested for pair in expected)
+        correct += found_pairs
+        recall[name_only] = found_pairs / max(len(expected), 1)
+        print(f"  {label:20} {len(expected):7,} "
+              f"found {recall[name_only]:.0%}")
+    # The made up last names differ only in 4 random letters, many
+    # different people are one typo apart and are suggested too
+    print(f"  {correct / max(len(suggested), 1):.0%} of the suggestions "
+          "are the copies made")
+    # A million rows in a few minutes. A name typo can change the
+    # sound of the last name, those copies land in another block
+    return (elapsed < args.rows / 1_000_000 * 300
+            and recall[False] > 0.95 and recall[True] > 0.5)
+
+
+# ---------------------------- CONCURRENCY ------------------------------- #
+def read_forever(database: str, journal_mode: str, seconds: float) -> int:
+    """Reader process, scan the whole table again and again
+       Each scan holds one read transaction open until it ends"""
+    config = db_operations.DatabaseConfig(journal_mode=journal_mode)
+    db = db_operations.DBOperations(database, config=config)
+    scans = 0
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        for _ in db.iter_records():
+            pass
+        scans += 1
+    db.close()
+    return scans
+
+
+def write_forever(
+    database: str,
+    journal_mode: str,
+    seconds: float,
+    seed: int
+) -> tuple:
+    """Writer process, insert and update records
+       Return the time of each write in ms and the failed writes"""
+    config = db_operations.DatabaseConfig(journal_mode=journal_mode)
+    db = db_operations.DBOperations(database, config=config)
+    contacts = random_contacts(1_000_000, seed)
+    times = []
+    failed = 0
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        first_name, last_name, phone, email = next(contacts)
+        start = time.perf_counter()
+        record = db.insert_record(first_name, last_name, phone, email)
+        if record is not None:
+            record = db.update_record(
+                first_name, last_name, "555.0100", email, record[0])
+        times.append((time.perf_counter() - start) * 1000)
+        if record is None:
+            failed += 1
+        # A person typing, not a bulk load
+        time.sleep(0.005)
+    db.close()
+    return times, failed
+
+
+def benchmark_concurrency(args) -> bool:
+    """Writers in their own processes while readers scan the table"""
+    config = db_operations.DatabaseConfig(journal_mode=args.journal_mode)
+    with temporary_database(args.rows, config=config) as db:
+        with db.pool.connection() as connection:
+            mode = connection.execute("PRAGMA journal_mode").fetchone()[0]
+        print(f"journal_mode {mode}, {args.readers} readers, "
+              f"{args.writers} writers for {args.seconds} s")
+
+        with ProcessPoolExecutor(args.readers + args.writers) as executor:
+            readers = [
+                executor.submit(read_forever, db.database,
+                                args.journal_mode, args.seconds)
+                for _ in range(args.readers)
+            ]
+            writers = [
+                executor.submit(write_forever, db.database,
+                                args.journal_mode, args.seconds, seed)
+                for seed in range(args.writers)
+            ]
+            scans = sum(reader.result() for reader in readers)
+            times = []
+            failed = 0
+            for writer in writers:
+                writer_times, writer_failed = writer.result()
+                times.extend(writer_times)
+                failed += writer_failed
+
+    p50 = percentile(times, 50)
+    p99 = percentile(times, 99)
+    print(f"{scans:,} full table scans, {len(times):,} writes, "
+          f"{failed} failed")
+    print(f"Write p50 {p50:.2f} ms  p99 {p99:.2f} ms  "
+          f"max {max(times):.2f} ms")
+    # Readers never make a write wait for them or fail
+    return failed == 0 and p99 < 100
+
+
+# ------------------------------- MEMORY --------------------------------- #
+def traced_load(load) -> tuple:
+    """Run load(), return its result and the bytes it allocated"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = load()
+    elapsed = time.perf_counter() - start
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size, elapsed
+
+
+def benchmark_memory(args) -> bool:
+    """Memory for every contact as a list of tuples and a ContactStore"""
+    with temporary_database(args.rows) as db:
+        records, list_size, elapsed = traced_load(db.fetch_all_records)
+        print(f"List of tuples  {list_size / 2**20:8.1f} MiB  "
+              f"{list_size / args.rows:6.1f} bytes/contact  "
+              f"loaded in {elapsed:.2f} s")
+        del records
+
+        # Same order as fetch_all_records
+        store, store_size, elapsed = traced_load(
+            lambda: ContactStore.from_database(db, "last_name", True))
+        print(f"ContactStore    {store_size / 2**20:8.1f} MiB  "
+              f"{store_size / args.rows:6.1f} bytes/contact  "
+              f"loaded in {elapsed:.2f} s")
+
+        # Every field reads back as it was stored
+        same = all(
+            contact == record
+            for contact, record in zip(
+                store, db.iter_records("last_name", True))
+        )
+    print(f"{list_size / store_size:.1f}x smaller, "
+          f"contents {'match' if same else 'DIFFER'}")
+    return same and store_size * 2 < list_size
+
+
+# ------------------------------- MAIN ----------------------------------- #
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    prefix = subparsers.add_parser("prefix", help="as-you-type search")
+    prefix.add_argument("--rows", type=int, default=1_000_000)
+    prefix.add_argument("--searches", type=int, default=200)
+    prefix.set_defaults(run=benchmark_prefix)
+
+    duplicates = subparsers.add_parser("dedupe", help="duplicate finder")
+    duplicates.add_argument("--rows", type=int, default=1_000_000)
+    duplicates.add_argument("--percent", type=float, default=2.0,
+                            help="percent of rows that are duplicates")
+    duplicates.add_argument("--workers", type=int, default=None)
+    duplicates.set_defaults(run=benchmark_dedupe)
+
+    concurrency = subparsers.add_parser(
+        "concurrency", help="readers and writers sharing the database")
+    concurrency.add_argument("--rows", type=int, default=200_000)
+    concurrency.add_argument("--readers", type=int, default=4)
+    concurrency.add_argument("--writers", type=int, default=2)
+    concurrency.add_argument("--seconds", type=float, default=10.0)
+    concurrency.add_argument("--journal-mode", default="WAL",
+                             help="WAL, or DELETE to compare")
+    concurrency.set_defaults(run=benchmark_concurrency)
+
+    memory = subparsers.add_parser(
+        "memory", help="list of tuples against ContactStore")
+    memory.add_argument("--rows", type=int, default=1_000_000)
+    memory.set_defaults(run=benchmark_memory)
+
+    args = parser.parse_args()
+    if args.run(args):
+        print("PASS")
+    else:
+        print("FAIL")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,291 @@
+"""
+    Name: columnar.py
+    Columnar snapshot of tbl_address_book for reporting jobs
+    Each column is stored as one binary buffer, names and emails are
+    dictionary encoded, every distinct value is stored once and rows
+    hold a small integer code. Snapshots are memory mapped when read,
+    so a column is used straight from the file without a Python
+    object per row.
+    Arrow IPC is written when pyarrow is installed, otherwise a
+    standard library format of length prefixed column buffers.
+    Usage: python columnar.py export snapshot.arrow [--no-arrow]
+           python columnar.py read snapshot.arrow
+"""
+# pip install pyarrow (optional)
+try:
+    import pyarrow
+    import pyarrow.compute
+    import pyarrow.ipc
+except ImportError:
+    pyarrow = None
+from array import array
+import argparse
+import mmap
+import struct
+import time
+import db_operations
+
+# Columns in the snapshot, id is int64, the rest dictionary encoded
+STRING_COLUMNS = ("first_name", "last_name", "phone", "email")
+COLUMNS = ("id",) + STRING_COLUMNS
+# Arrow record batches share one dictionary per column
+BATCH_ROWS = 65_536
+# Start of an Arrow IPC file and of the fallback format
+ARROW_MAGIC = b"ARROW1"
+MAGIC = b"ABCOLS1\0"
+# Code for a NULL value in the fallback format
+NULL_CODE = -1
+
+
+# ----------------------------- ENCODING --------------------------------- #
+def encode_columns(db_op: db_operations.DBOperations) -> tuple:
+    """Read the table once in id order
+       Return (ids, {column: (codes, values)}), ids and codes are
+       arrays, values is the list of distinct values in code order"""
+    ids = array("q")
+    columns = {name: (array("i"), [], {}) for name in STRING_COLUMNS}
+    encoders = [columns[name] for name in STRING_COLUMNS]
+    for record in db_op.iter_records("id"):
+        ids.append(record[0])
+        for value, (codes, values, lookup) in zip(record[1:], encoders):
+            if value is None:
+                codes.append(NULL_CODE)
+                continue
+            code = lookup.get(value)
+            if code is None:
+                code = lookup[value] = len(values)
+                values.append(value)
+            codes.append(code)
+    return ids, {
+        name: (codes, values)
+        for name, (codes, values, _) in columns.items()
+    }
+
+
+# --------------------------- ARROW FORMAT ------------------------------- #
+def arrow_table(ids: array, columns: dict):
+    """Build a pyarrow Table on the arrays without copying them"""
+    arrays = [pyarrow.Array.from_buffers(
+        pyarrow.int64(), len(ids), [None, pyarrow.py_buffer(ids)])]
+    for name in STRING_COLUMNS:
+        codes, values = columns[name]
+        indices = pyarrow.Array.from_buffers(
+            pyarrow.int32(), len(codes), [None, pyarrow.py_buffer(codes)])
+        if NULL_CODE in codes:
+            indices = pyarrow.compute.if_else(
+                pyarrow.compute.equal(indices, NULL_CODE),
+                pyarrow.scalar(None, pyarrow.int32()),
+                indices
+            )
+        arrays.append(pyarrow.DictionaryArray.from_arrays(
+            indices, pyarrow.array(values, pyarrow.string())))
+    return pyarrow.Table.from_arrays(arrays, names=list(COLUMNS))
+
+
+def write_arrow(path: str, ids: array, columns: dict):
+    table = arrow_table(ids, columns)
+    with pyarrow.ipc.new_file(path, table.schema) as writer:
+        writer.write_table(table, max_chunksize=BATCH_ROWS)
+
+
+# -------------------------- FALLBACK FORMAT ----------------------------- #
+# MAGIC, row count, column count, then for each column its name and
+# its buffers. Every buffer is an 8 byte length then the bytes,
+# padded to 8 bytes so an array cast over the file is aligned
+#   id:       int64 values
+#   strings:  int32 codes, int64 offsets into the data, utf-8 data
+def write_buffer(file, data: bytes):
+    file.write(struct.pack("<q", len(data)))
+    file.write(data)
+    file.write(b"\0" * (-len(data) % 8))
+
+
+def write_fallback(path: str, ids: array, columns: dict):
+    with open(path, "wb") as file:
+        file.write(MAGIC)
+        file.write(struct.pack("<qq", len(ids), len(COLUMNS)))
+        write_buffer(file, b"id")
+        write_buffer(file, ids.tobytes())
+        for name in STRING_COLUMNS:
+            codes, values = columns[name]
+            encoded = [value.encode("utf-8") for value in values]
+            offsets = array("q", [0])
+            for value in encoded:
+                offsets.append(offsets[-1] + len(value))
+            write_buffer(file, name.encode("utf-8"))
+            write_buffer(file, codes.tobytes())
+            write_buffer(file, offsets.tobytes())
+            write_buffer(file, b"".join(encoded))
+
+
+class DictionaryColumn:
+    """A dictionary encoded string column read from a snapshot
+       codes is a memoryview of int32 over the file, a value is
+       only decoded when it is asked for"""
+
+    def __init__(self, codes, offsets, data):
+        self.codes = codes
+        self.offsets = offsets
+        self.data = data
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, row: int) -> str:
+        return self.value(self.codes[row])
+
+    def value(self, code: int) -> str:
+        """The distinct value with a code, None for NULL"""
+        if code == NULL_CODE:
+            return None
+        return str(self.data[self.offsets[code]:self.offsets[code + 1]],
+                   "utf-8")
+
+    def dictionary(self) -> list:
+        """Every distinct value, in code order"""
+        return [self.value(code) for code in range(len(self.offsets) - 1)]
+
+    def release(self):
+        """Let go of the file, like memoryview.release()
+           The column can't be read after this"""
+        for view in (self.codes, self.offsets, self.data):
+            view.release()
+
+
+class ColumnSnapshot:
+    """A fallback format snapshot, memory mapped
+       column("id") is a memoryview of int64, the others are
+       DictionaryColumns. Columns are views of the file, close()
+       releases them and they can't be read after it"""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as file:
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view = memoryview(self.map)
+        self.columns = {}
+        if self.view[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a column snapshot")
+        self.position = len(MAGIC)
+        self.num_rows, count = struct.unpack_from(
+            "<qq", self.map, self.position)
+        self.position += 16
+        for _ in range(count):
+            name = str(self.read_buffer(), "utf-8")
+            if name == "id":
+                self.columns[name] = self.read_buffer().cast("q")
+            else:
+                self.columns[name] = DictionaryColumn(
+                    self.read_buffer().cast("i"),
+                    self.read_buffer().cast("q"),
+                    self.read_buffer()
+                )
+
+    def read_buffer(self):
+        """The next buffer, a slice of the memory map, not a copy"""
+        size = struct.unpack_from("<q", self.map, self.position)[0]
+        start = self.position + 8
+        self.position = start + size + (-size % 8)
+        return self.view[start:start + size]
+
+    @property
+    def column_names(self) -> list:
+        return list(self.columns)
+
+    def column(self, name: str):
+        return self.columns[name]
+
+    def close(self):
+        """Release the columns handed out, then close the file
+           Raise BufferError if a buffer taken from a column, a numpy
+           array or a memoryview of one, is still in use"""
+        # Views over the map must go before the map can close
+        in_use = []
+        for name, column in self.columns.items():
+            try:
+                column.release()
+            except BufferError:
+                in_use.append(name)
+        if in_use:
+            raise BufferError(
+                f"Snapshot columns {', '.join(in_use)} are still in use "
+                "by buffers taken from them, release those first")
+        self.view.release()
+        try:
+            self.map.close()
+        except BufferError:
+            # memoryview(column) shares the column's buffer, so which
+            # column it came from can't be told
+            raise BufferError(
+                "A memoryview taken from a snapshot column is still "
+                "open, release it first") from None
+        self.columns = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+# ------------------------- EXPORT AND READ ------------------------------ #
+def export_snapshot(
+    db_op: db_operations.DBOperations,
+    path: str,
+    use_arrow: bool = None
+) -> int:
+    """Write tbl_address_book to a columnar snapshot file
+       Arrow IPC if pyarrow is installed, unless use_arrow is False
+       Return the number of rows"""
+    if use_arrow is None:
+        use_arrow = pyarrow is not None
+    if use_arrow and pyarrow is None:
+        raise ValueError("Arrow snapshots need pyarrow, pip install pyarrow")
+    ids, columns = encode_columns(db_op)
+    if use_arrow:
+        write_arrow(path, ids, columns)
+    else:
+        write_fallback(path, ids, columns)
+    return len(ids)
+
+
+def read_snapshot(path: str):
+    """Open a snapshot without copying it into memory
+       An Arrow file gives a pyarrow Table, the fallback format
+       a ColumnSnapshot, both have num_rows, column_names and
+       column(name)"""
+    with open(path, "rb") as file:
+        magic = file.read(len(MAGIC))
+    if magic.startswith(ARROW_MAGIC):
+        if pyarrow is None:
+            raise ValueError(f"{path} is Arrow IPC, pip install pyarrow")
+        return pyarrow.ipc.open_file(pyarrow.memory_map(path)).read_all()
+    return ColumnSnapshot(path)
+
+
+# ------------------------------ START ----------------------------------- #
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("command", choices=("export", "read"))
+    parser.add_argument("path")
+    parser.add_argument("--no-arrow", action="store_true",
+                        help="write the standard library format")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.command == "export":
+        db = db_operations.DBOperations("address_book.db")
+        rows = export_snapshot(
+            db, args.path, False if args.no_arrow else None)
+        db.close()
+        print(f"{rows:,} rows written to {args.path}")
+    else:
+        snapshot = read_snapshot(args.path)
+        print(f"{snapshot.num_rows:,} rows, "
+              f"columns {', '.join(snapshot.column_names)}")
+        if isinstance(snapshot, ColumnSnapshot):
+            with snapshot:
+                last_names = snapshot.column("last_name")
+                print(f"{len(last_names.offsets) - 1:,} distinct last "
+                      f"names, first row {last_names[0]!r}")
+    print(f"{time.perf_counter() - start:.2f} s")
@@ -0,0 +1,335 @@
+"""
+    Name: contact_store.py
+    Compact in memory list of contacts
+    A list of (id, first_name, last_name, phone, email) tuples costs a
+    tuple, an int and four str objects per contact. ContactStore keeps
+    each field in a column instead. ids are an array of int64, names
+    and email domains are dictionary encoded, every distinct value is
+    stored once and rows hold an int32 code, and phones and the part
+    of the email before the @ are packed into one bytearray.
+    store[row] gives a Contact, a __slots__ view that reads like the
+    tuple, record[0] is the id and it unpacks into five values.
+"""
+from array import array
+from bisect import bisect_left
+import db_operations
+
+# Code for a NULL value in a dictionary encoded column
+NULL_CODE = -1
+
+
+# ------------------------- DICTIONARY COLUMN ---------------------------- #
+class EncodedColumn:
+    """Strings that repeat, each distinct value is kept once
+       Values no row uses any more stay in the dictionary until
+       the store is rebuilt"""
+
+    def __init__(self):
+        # The code of each row
+        self.codes = array("i")
+        # The distinct values, packed, a code is a row of values.
+        # Only ever appended to, so their starts are in order
+        self.values = PackedColumn()
+        # value: code, only while loading, a dict entry and a str
+        # per distinct value would cost more than the column
+        self.lookup = None
+
+    def find(self, value: str) -> int:
+        """The code of a value already in the dictionary, or None"""
+        if self.lookup is not None:
+            return self.lookup.get(value)
+        encoded = value.encode("utf-8")
+        if not encoded:
+            try:
+                return self.values.lengths.index(0)
+            except ValueError:
+                return None
+        # Search the packed values in C, a match must be a whole value
+        data = self.values.data
+        position = data.find(encoded)
+        while position >= 0:
+            code = bisect_left(self.values.starts, position)
+            if (code < len(self.values.starts)
+                    and self.values.starts[code] == position
+                    and self.values.lengths[code] == len(encoded)):
+                return code
+            position = data.find(encoded, position + 1)
+        return None
+
+    def encode(self, value: str) -> int:
+        if value is None:
+            return NULL_CODE
+        code = self.find(value)
+        if code is None:
+            code = len(self.values.lengths)
+            self.values.append(value)
+            if self.lookup is not None:
+                self.lookup[value] = code
+        return code
+
+    def start_loading(self):
+        self.lookup = {
+            self.values.get(code): code
+            for code in range(len(self.values.lengths))
+        }
+
+    def finish_loading(self):
+        self.lookup = None
+
+    def get(self, row: int) -> str:
+        code = self.codes[row]
+        return None if code == NULL_CODE else self.values.get(code)
+
+    def append(self, value: str):
+        self.codes.append(self.encode(value))
+
+    def insert(self, row: int, value: str):
+        self.codes.insert(row, self.encode(value))
+
+    def set(self, row: int, value: str):
+        self.codes[row] = self.encode(value)
+
+    def delete(self, row: int):
+        del self.codes[row]
+
+
+# --------------------------- PACKED COLUMN ------------------------------ #
+class PackedColumn:
+    """Strings that are mostly unique, stored as UTF-8 in one
+       bytearray with the start and length of each row"""
+
+    def __init__(self):
+        self.data = bytearray()
+        self.starts = array("q")
+        # -1 for NULL
+        self.lengths = array("i")
+        # Bytes no row points at after updates and deletes
+        self.unused = 0
+
+    def pack(self, value: str) -> tuple:
+        """Add a value to the end of data, return (start, length)"""
+        if value is None:
+            return 0, -1
+        encoded = value.encode("utf-8")
+        start = len(self.data)
+        self.data += encoded
+        return start, len(encoded)
+
+    def get(self, row: int) -> str:
+        length = self.lengths[row]
+        if length < 0:
+            return None
+        start = self.starts[row]
+        return self.data[start:start + length].decode("utf-8")
+
+    def append(self, value: str):
+        start, length = self.pack(value)
+        self.starts.append(start)
+        self.lengths.append(length)
+
+    def insert(self, row: int, value: str):
+        start, length = self.pack(value)
+        self.starts.insert(row, start)
+        self.lengths.insert(row, length)
+
+    def set(self, row: int, value: str):
+        self.unused += max(self.lengths[row], 0)
+        self.starts[row], self.lengths[row] = self.pack(value)
+        self.compact()
+
+    def delete(self, row: int):
+        self.unused += max(self.lengths[row], 0)
+        del self.starts[row]
+        del self.lengths[row]
+        self.compact()
+
+    def compact(self):
+        """Copy the values in use to a new bytearray once more than
+           half of data is unused"""
+        if self.unused * 2 <= len(self.data):
+            return
+        data = bytearray()
+        for row, length in enumerate(self.lengths):
+            if length >= 0:
+                start = self.starts[row]
+                self.starts[row] = len(data)
+                data += self.data[start:start + length]
+        self.data = data
+        self.unused = 0
+
+
+# ------------------------------ CONTACT --------------------------------- #
+class Contact:
+    """View of one row of a ContactStore
+       Fields are read from the store when asked for. A view is only
+       good until rows are inserted or deleted before it"""
+    __slots__ = ("store", "row")
+
+    def __init__(self, store, row: int):
+        self.store = store
+        self.row = row
+
+    @property
+    def id(self) -> int:
+        return self.store.ids[self.row]
+
+    @property
+    def first_name(self) -> str:
+        return self.store.first_names.get(self.row)
+
+    @property
+    def last_name(self) -> str:
+        return self.store.last_names.get(self.row)
+
+    @property
+    def phone(self) -> str:
+        return self.store.phones.get(self.row)
+
+    @property
+    def email(self) -> str:
+        return self.store.email(self.row)
+
+    def as_tuple(self) -> tuple:
+        """(id, first_name, last_name, phone, email)"""
+        return self.store.record(self.row)
+
+    # Behave like the record tuple the views used to hold
+    def __len__(self):
+        return 5
+
+    def __getitem__(self, index):
+        return self.as_tuple()[index]
+
+    def __iter__(self):
+        return iter(self.as_tuple())
+
+    def __eq__(self, other):
+        if isinstance(other, Contact):
+            other = other.as_tuple()
+        return self.as_tuple() == other
+
+    def __repr__(self):
+        return f"Contact{self.as_tuple()!r}"
+
+
+# ---------------------------- CONTACT STORE ----------------------------- #
+class ContactStore:
+    """Contacts in display order, one column per field"""
+
+    def __init__(self, records=()):
+        self.ids = array("q")
+        self.first_names = EncodedColumn()
+        self.last_names = EncodedColumn()
+        self.phones = PackedColumn()
+        # The email is split at the last @, the domains repeat
+        self.email_users = PackedColumn()
+        self.email_domains = EncodedColumn()
+        self.extend(records)
+
+    @classmethod
+    def from_database(
+        cls,
+        db_op: db_operations.DBOperations,
+        order_by: str = "last_name",
+        descending: bool = False
+    ):
+        """Load every record, streamed so no list of tuples is built"""
+        return cls(db_op.iter_records(order_by, descending))
+
+    @staticmethod
+    def split_email(email: str) -> tuple:
+        """("bill", "example.com") for bill@example.com,
+           the domain is None when there is no @"""
+        if email is None or "@" not in email:
+            return email, None
+        user, _, domain = email.rpartition("@")
+        return user, domain
+
+    def email(self, row: int) -> str:
+        user = self.email_users.get(row)
+        domain = self.email_domains.get(row)
+        return user if domain is None else f"{user}@{domain}"
+
+# ------------------------------- READ ----------------------------------- #
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, row: int) -> Contact:
+        if row < 0:
+            row += len(self.ids)
+        if not 0 <= row < len(self.ids):
+            raise IndexError("ContactStore index out of range")
+        return Contact(self, row)
+
+    def __iter__(self):
+        for row in range(len(self.ids)):
+            yield Contact(self, row)
+
+    def record(self, row: int) -> tuple:
+        """The (id, first_name, last_name, phone, email) of a row"""
+        return (
+            self.ids[row],
+            self.first_names.get(row),
+            self.last_names.get(row),
+            self.phones.get(row),
+            self.email(row)
+        )
+
+    def row_of(self, id: int) -> int:
+        """The row of a record id, or None"""
+        try:
+            # A scan in C over the int64 array
+            return self.ids.index(id)
+        except ValueError:
+            return None
+
+# ------------------------------- WRITE ---------------------------------- #
+    def append(self, record: tuple):
+        id, first_name, last_name, phone, email = record
+        user, domain = self.split_email(email)
+        self.ids.append(id)
+        self.first_names.append(first_name)
+        self.last_names.append(last_name)
+        self.phones.append(phone)
+        self.email_users.append(user)
+        self.email_domains.append(domain)
+
+    def extend(self, records):
+        columns = (self.first_names, self.last_names, self.email_domains)
+        for column in columns:
+            column.start_loading()
+        try:
+            for record in records:
+                self.append(record)
+        finally:
+            for column in columns:
+                column.finish_loading()
+
+    def insert(self, row: int, record: tuple):
+        """Insert a record before row"""
+        id, first_name, last_name, phone, email = record
+        user, domain = self.split_email(email)
+        self.ids.insert(row, id)
+        self.first_names.insert(row, first_name)
+        self.last_names.insert(row, last_name)
+        self.phones.insert(row, phone)
+        self.email_users.insert(row, user)
+        self.email_domains.insert(row, domain)
+
+    def __setitem__(self, row: int, record: tuple):
+        id, first_name, last_name, phone, email = record
+        user, domain = self.split_email(email)
+        self.ids[row] = id
+        self.first_names.set(row, first_name)
+        self.last_names.set(row, last_name)
+        self.phones.set(row, phone)
+        self.email_users.set(row, user)
+        self.email_domains.set(row, domain)
+
+    def __delitem__(self, row: int):
+        del self.ids[row]
+        self.first_names.delete(row)
+        self.last_names.delete(row)
+        self.phones.delete(row)
+        self.email_users.delete(row)
+        self.email_domains.delete(row)
@@ -0,0 +1,270 @@
+"""
+    Name: contact_table_model.py
+    Qt table model for the PySide6 contact list
+    Records are fetched from DBOperations a page at a time as the view
+    scrolls (canFetchMore/fetchMore). Sorting and filtering run in
+    SQL, so the view never holds more rows than were scrolled to.
+    With a QtDBWorker the reads and writes run off the GUI thread.
+"""
+# pip install pyside6
+from PySide6.QtCore import Qt, QAbstractTableModel, QModelIndex
+import db_operations
+
+HEADERS = ["ID", "First Name", "Last Name", "Phone", "Email"]
+# With a worker, read the next page once the view shows a row
+# this close to the end of the fetched records
+PREFETCH_ROWS = 50
+
+
+class ContactTableModel(QAbstractTableModel):
+    def __init__(
+        self,
+        db_op: db_operations.DBOperations,
+        page_size: int = 200,
+        worker=None,
+        parent=None
+    ):
+        super().__init__(parent)
+        self.db_op = db_op
+        self.page_size = page_size
+        # QtDBWorker to read the database off the GUI thread,
+        # None reads on the GUI thread
+        self.worker = worker
+        # Records fetched so far, in display order
+        self.records = []
+        # True when the last page has been fetched
+        self.at_end = False
+        # SQL sort order
+        self.order_by = "last_name"
+        self.direction = "asc"
+        # (field, text) prefix filter, or None for every record
+        self.filter = None
+        # True while the next page is being read
+        self.fetching = False
+        # Counts resets, a read started before a reset is out of date
+        self.generation = 0
+        # Highest row the view has asked to show
+        self.last_row_shown = -1
+
+    def call(self, callback, function, *args, key: str = None):
+        """Run a database call, on the worker thread if there is one,
+           then pass the result to callback on the GUI thread"""
+        if self.worker is None:
+            callback(function(*args))
+        else:
+            self.worker.submit(function, *args, callback=callback, key=key)
+
+# --------------------------- TABLE SHAPE -------------------------------- #
+    def rowCount(self, parent=QModelIndex()):
+        # A table has no child rows
+        return 0 if parent.isValid() else len(self.records)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(HEADERS)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and index.isValid():
+            if index.row() > self.last_row_shown:
+                self.last_row_shown = index.row()
+                # Only queues the read, the rows are added later
+                if self.worker is not None and self.canFetchMore():
+                    self.fetchMore()
+            value = self.records[index.row()][index.column()]
+            return "" if value is None else str(value)
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return HEADERS[section]
+        return None
+
+# ------------------------ INCREMENTAL LOADING --------------------------- #
+    def canFetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or self.at_end or self.fetching:
+            return False
+        if self.worker is None:
+            return True
+        # QTreeView asks for more every time rows are added, with
+        # pages arriving later that would read the whole table.
+        # Wait until the view has scrolled near the end instead
+        return (self.last_row_shown
+                >= len(self.records) - PREFETCH_ROWS)
+
+    def fetchMore(self, parent=QModelIndex()):
+        """Read the next page, the view calls this as it scrolls"""
+        if not self.canFetchMore(parent):
+            return
+        # Seek past the last record fetched so far
+        key = None
+        if self.records:
+            key = db_operations.page_key(self.records[-1], self.order_by)
+        generation = self.generation
+        self.fetching = True
+
+        def add_page(page):
+            if generation != self.generation:
+                # Sorted or filtered while reading, the page is for
+                # the old list
+                return
+            self.fetching = False
+            if len(page) < self.page_size:
+                self.at_end = True
+            if page:
+                first = len(self.records)
+                self.beginInsertRows(
+                    QModelIndex(), first, first + len(page) - 1)
+                self.records.extend(page)
+                self.endInsertRows()
+
+        self.call(
+            add_page, self.db_op.fetch_page,
+            key, self.page_size, self.order_by, self.direction,
+            key="model page"
+        )
+
+# ------------------------- SORT AND FILTER ------------------------------ #
+    def sort(self, column, order=Qt.AscendingOrder):
+        """Sort in SQL by the clicked column, ties by id"""
+        self.order_by = db_operations.SORT_COLUMNS[column]
+        self.direction = "desc" if order == Qt.DescendingOrder else "asc"
+        self.refresh()
+
+    def set_filter(self, field: str = None, text: str = ""):
+        """Show only records where field starts with text,
+           no field shows every record"""
+        self.filter = (field, text) if field and text else None
+        self.refresh()
+
+    def refresh(self):
+        """Throw away the fetched records and start again"""
+        self.generation += 1
+        self.fetching = False
+        self.last_row_shown = -1
+        if self.filter is None:
+            # The view asks for the first page with fetchMore
+            self.beginResetModel()
+            self.records = []
+            self.at_end = False
+            self.endResetModel()
+            return
+
+        # No more pages for the old list while the matches are read
+        self.at_end = True
+        generation = self.generation
+
+        def show_matches(records):
+            if generation != self.generation:
+                return
+            # Prefix matches are a short list, sort them here
+            # the same way ORDER BY column, id sorts in the database
+            records.sort(
+                key=lambda record: db_operations.sort_key(
+                    record, self.order_by),
+                reverse=(self.direction == "desc")
+            )
+            self.beginResetModel()
+            self.records = records
+            self.endResetModel()
+
+        # Each keystroke supersedes the search for the one before
+        field, text = self.filter
+        self.call(
+            show_matches, self.db_op.prefix_search, field, text, 200,
+            key="model filter"
+        )
+
+# ----------------------- INCREMENTAL UPDATES ---------------------------- #
+    def insert_record(
+        self,
+        first_name: str,
+        last_name: str,
+        phone: str,
+        email: str,
+        callback=None
+    ):
+        """Insert a record and add its row without a reset,
+           callback gets the new record or None"""
+        self.write(callback, "insert", self.db_op.insert_record,
+                   first_name, last_name, phone, email)
+
+    def update_record(
+        self,
+        first_name: str,
+        last_name: str,
+        phone: str,
+        email: str,
+        id: int,
+        callback=None
+    ):
+        """Update a record and move its row to its new sorted place,
+           callback gets the updated record or None"""
+        self.write(callback, "update", self.db_op.update_record,
+                   first_name, last_name, phone, email, id)
+
+    def delete_record(self, id: int, callback=None):
+        """Delete a record and remove its row without a reset,
+           callback gets the deleted id or None"""
+        self.write(callback, "delete", self.db_op.delete_record, id)
+
+    def write(self, callback, change: str, function, *args):
+        """Run a database write, then patch the changed row. The new
+           row number is read in the same call so nothing can change
+           the table in between"""
+        generation = self.generation
+        order_by, direction = self.order_by, self.direction
+        # A filtered list finds the place in memory
+        find_position = change != "delete" and self.filter is None
+
+        def run():
+            result = function(*args)
+            position = None
+            if result is not None and find_position:
+                position = self.db_op.record_position(
+                    result, order_by, direction)
+            return result, position
+
+        def done(written):
+            result, position = written
+            if result is not None:
+                self.patch(change, result, position, generation)
+            if callback is not None:
+                callback(result)
+
+        self.call(done, run)
+
+    def patch(self, change: str, result, position: int, generation: int):
+        """Apply a finished write to the fetched records"""
+        if self.filter is None and generation != self.generation:
+            # Every page now was read after the write
+            return
+        id = result if change == "delete" else result[0]
+        # A page read after the write may have the record too
+        for row in reversed(range(len(self.records))):
+            if self.records[row][0] == id:
+                self.beginRemoveRows(QModelIndex(), row, row)
+                del self.records[row]
+                self.endRemoveRows()
+        if change == "delete":
+            return
+
+        if self.filter is not None:
+            # Count the filtered records that sort before it
+            key = db_operations.sort_key(result, self.order_by)
+            if self.direction == "desc":
+                position = sum(
+                    1 for other in self.records
+                    if db_operations.sort_key(other, self.order_by) > key)
+            else:
+                position = sum(
+                    1 for other in self.records
+                    if db_operations.sort_key(other, self.order_by) < key)
+        elif position >= len(self.records) and not self.at_end:
+            # Past the fetched rows, fetchMore will bring it in
+            return
+        self.beginInsertRows(QModelIndex(), position, position)
+        self.records.insert(position, result)
+        self.endInsertRows()
+
+    def record(self, row: int) -> tuple:
+        """The (id, first_name, last_name, phone, email) of a row"""
+        return self.records[row]
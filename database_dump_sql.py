@@ -1,13 +1,47 @@
-import sqlite3
-conn = sqlite3.connect("address_book.db")
-obj = conn.iterdump()
+"""
+    Name: database_dump_sql.py
+    Dump address_book.db to database_dump.sql in one pass, restore a
+    dump into a new database, or copy the database file with the
+    SQLite backup API while it is in use
+    An output or dump file ending in .gz, .xz or .zst is compressed
+    Usage: python database_dump_sql.py [--quiet] [--output FILE]
+           python database_dump_sql.py --restore FILE --database NEW.db
+           python database_dump_sql.py --backup [FILE]
+"""
+import argparse
+import db_operations
 
-for line in conn.iterdump():
-    print(line)
 
-# Use with context manager to write and close/save the file
-with open("database_dump.sql", "w") as file:
+def show_lines(lines: int):
+    print(f"\r{lines:,} lines", end="", flush=True)
 
-    for line in conn.iterdump():
-        file.write(f"{line}\n")
-print("File written to disk.")
\ No newline at end of file
+
+def show_pages(copied: int, total: int):
+    print(f"\r{copied:,} of {total:,} pages", end="", flush=True)
+
+
+parser = argparse.ArgumentParser(description=__doc__)
+parser.add_argument("--database", default="address_book.db")
+parser.add_argument("--output", default=db_operations.DUMP_FILE,
+                    help="dump file, database_dump.sql.gz is compressed")
+parser.add_argument("--quiet", action="store_true",
+                    help="show progress instead of every line")
+parser.add_argument("--restore", metavar="FILE",
+                    help="load a dump into --database, which must be new")
+parser.add_argument("--backup", nargs="?", const=db_operations.BACKUP_FILE,
+                    help="copy the database file instead of dumping SQL")
+args = parser.parse_args()
+
+db = db_operations.DBOperations(args.database)
+if args.restore:
+    statements = db.restore_dump(args.restore, progress=show_lines)
+    if statements is not None:
+        print(f"\n{args.restore} restored to {args.database}")
+elif args.backup:
+    if db.backup(args.backup, progress=show_pages):
+        print(f"\nDatabase copied to {args.backup}")
+elif args.quiet:
+    db.database_dump(args.output, echo=False, progress=show_lines)
+else:
+    db.database_dump(args.output)
+db.close()
@@ -7,6 +7,41 @@
 """
 # Import SQLite library to work with databases
 import sqlite3
+# Thread safe queue and lock for the connection pool
+import queue
+import threading
+import gzip
+import lzma
+import random
+import string
+import time
+import json
+import re
+import csv
+import io
+import os
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import product
+from contextlib import contextmanager
+# zstd is in the standard library from Python 3.14
+try:
+    from compression import zstd
+except ImportError:
+    zstd = None
+# Sorted array prefix index for as-you-type filtering
+from prefix_index import PrefixIndex, MemoryBudgetExceeded, DEFAULT_MEMORY_BUDGET
+# Least recently used cache of query results
+from query_cache import QueryCache, DEFAULT_CACHE_BUDGET
+
+# Punctuation removed from phone numbers before they are indexed
+# "123.456.7890" and "(123) 456-7890" both become "1234567890"
+PHONE_PUNCTUATION = ".-()+ "
+# The same normalization as an SQL expression
+# Lookups must use this exact expression to use the phone index
+PHONE_DIGITS = "phone"
+for character in PHONE_PUNCTUATION:
+    PHONE_DIGITS = f"replace({PHONE_DIGITS}, '{character}', '')"
 
 # -------------------------- SQL ----------------------------------------- #
 CREATE_TABLE = """
@@ -15,24 +50,347 @@ CREATE_TABLE = """
     first_name  TEXT,
     last_name   TEXT,
     phone       TEXT,
-    email       TEXT
+    email       TEXT,
+    first_name_soundex  TEXT,
+    last_name_soundex   TEXT
     )
     """
+# Possible duplicate contacts found by dedupe.py for review
+# Suggestions go away with either record (ON DELETE CASCADE)
+CREATE_MERGE_SUGGESTIONS = """
+    CREATE TABLE IF NOT EXISTS tbl_merge_suggestion(
+    id          INTEGER PRIMARY KEY,
+    keep_id     INTEGER REFERENCES tbl_address_book(id) ON DELETE CASCADE,
+    merge_id    INTEGER REFERENCES tbl_address_book(id) ON DELETE CASCADE,
+    score       REAL,
+    reason      TEXT,
+    status      TEXT NOT NULL DEFAULT 'new',
+    UNIQUE(keep_id, merge_id)
+    );
+    CREATE INDEX IF NOT EXISTS idx_merge_suggestion_merge_id
+    ON tbl_merge_suggestion(merge_id);
+    CREATE INDEX IF NOT EXISTS idx_merge_suggestion_status
+    ON tbl_merge_suggestion(status, score);
+    """
+# Phonetic key columns added to tables created before they existed
+PHONETIC_COLUMNS = ("first_name_soundex", "last_name_soundex")
+ADD_COLUMN = """
+    ALTER TABLE tbl_address_book ADD COLUMN {name} TEXT
+    """
+# The name is in the index so matches come back in name order
+CREATE_PHONETIC_INDEXES = """
+    CREATE INDEX IF NOT EXISTS idx_address_book_first_name_soundex
+    ON tbl_address_book(first_name_soundex, first_name, id);
+    CREATE INDEX IF NOT EXISTS idx_address_book_last_name_soundex
+    ON tbl_address_book(last_name_soundex, last_name, id);
+    """
+# Composite indexes let ORDER BY column, id and the keyset
+# pagination queries walk an index instead of sorting the table
+# They index the SORT_EXPRESSIONS, the column itself is added so
+# COUNT_BEFORE is answered from the index without reading rows.
+# The older plain column indexes they replace are dropped
+CREATE_INDEXES = """
+    DROP INDEX IF EXISTS idx_address_book_first_name;
+    DROP INDEX IF EXISTS idx_address_book_last_name;
+    DROP INDEX IF EXISTS idx_address_book_phone;
+    DROP INDEX IF EXISTS idx_address_book_email;
+    CREATE INDEX IF NOT EXISTS idx_address_book_first_name_sort
+    ON tbl_address_book(coalesce(first_name, ''), id, first_name);
+    CREATE INDEX IF NOT EXISTS idx_address_book_last_name_sort
+    ON tbl_address_book(coalesce(last_name, ''), id, last_name);
+    CREATE INDEX IF NOT EXISTS idx_address_book_phone_sort
+    ON tbl_address_book(coalesce(phone, ''), id, phone);
+    CREATE INDEX IF NOT EXISTS idx_address_book_email_sort
+    ON tbl_address_book(coalesce(email, ''), id, email);
+    CREATE INDEX IF NOT EXISTS idx_address_book_first_name_nocase
+    ON tbl_address_book(first_name COLLATE NOCASE, id);
+    CREATE INDEX IF NOT EXISTS idx_address_book_last_name_nocase
+    ON tbl_address_book(last_name COLLATE NOCASE, id);
+    CREATE INDEX IF NOT EXISTS idx_address_book_email_nocase
+    ON tbl_address_book(email COLLATE NOCASE);
+    """ + f"""
+    CREATE INDEX IF NOT EXISTS idx_address_book_phone_digits
+    ON tbl_address_book({PHONE_DIGITS});
+    """
+
+# Full text search index over the contact columns
+# content= makes it an external content table, the text is read
+# from tbl_address_book and the triggers keep the index in sync
+CREATE_SEARCH = """
+    CREATE VIRTUAL TABLE IF NOT EXISTS fts_address_book USING fts5(
+    first_name,
+    last_name,
+    phone,
+    email,
+    content='tbl_address_book',
+    content_rowid='id'
+    );
+    CREATE TRIGGER IF NOT EXISTS trg_address_book_search_insert
+    AFTER INSERT ON tbl_address_book BEGIN
+        INSERT INTO fts_address_book(
+            rowid, first_name, last_name, phone, email)
+        VALUES(new.id, new.first_name, new.last_name, new.phone, new.email);
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_address_book_search_delete
+    AFTER DELETE ON tbl_address_book BEGIN
+        INSERT INTO fts_address_book(
+            fts_address_book, rowid, first_name, last_name, phone, email)
+        VALUES('delete', old.id, old.first_name, old.last_name,
+            old.phone, old.email);
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_address_book_search_update
+    AFTER UPDATE OF first_name, last_name, phone, email
+    ON tbl_address_book BEGIN
+        INSERT INTO fts_address_book(
+            fts_address_book, rowid, first_name, last_name, phone, email)
+        VALUES('delete', old.id, old.first_name, old.last_name,
+            old.phone, old.email);
+        INSERT INTO fts_address_book(
+            rowid, first_name, last_name, phone, email)
+        VALUES(new.id, new.first_name, new.last_name, new.phone, new.email);
+    END;
+    """
+# Trigram index of the names for typo tolerant (fuzzy) search
+# Each 3 letter piece of a name, "lor" "ori" "rin" "ing", is indexed
+CREATE_TRIGRAM = """
+    CREATE VIRTUAL TABLE IF NOT EXISTS fts_name_trigram USING fts5(
+    first_name,
+    last_name,
+    content='tbl_address_book',
+    content_rowid='id',
+    tokenize='trigram'
+    );
+    CREATE TRIGGER IF NOT EXISTS trg_address_book_trigram_insert
+    AFTER INSERT ON tbl_address_book BEGIN
+        INSERT INTO fts_name_trigram(rowid, first_name, last_name)
+        VALUES(new.id, new.first_name, new.last_name);
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_address_book_trigram_delete
+    AFTER DELETE ON tbl_address_book BEGIN
+        INSERT INTO fts_name_trigram(
+            fts_name_trigram, rowid, first_name, last_name)
+        VALUES('delete', old.id, old.first_name, old.last_name);
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_address_book_trigram_update
+    AFTER UPDATE OF first_name, last_name ON tbl_address_book BEGIN
+        INSERT INTO fts_name_trigram(
+            fts_name_trigram, rowid, first_name, last_name)
+        VALUES('delete', old.id, old.first_name, old.last_name);
+        INSERT INTO fts_name_trigram(rowid, first_name, last_name)
+        VALUES(new.id, new.first_name, new.last_name);
+    END;
+    -- The number of records with each trigram, read from the index
+    CREATE VIRTUAL TABLE IF NOT EXISTS fts_name_trigram_vocab
+    USING fts5vocab(fts_name_trigram, 'row');
+    """
+# Full text tables that are rebuilt and optimized together
+SEARCH_TABLES = ("fts_address_book", "fts_name_trigram")
+REBUILD_SEARCH = """
+    INSERT INTO {table}({table}) VALUES('rebuild')
+    """
+OPTIMIZE_SEARCH = """
+    INSERT INTO {table}({table}) VALUES('optimize')
+    """
 
 INSERT_RECORD = """
-    INSERT INTO tbl_address_book
-    VALUES(NULL, ?, ?, ?, ?)
+    INSERT INTO tbl_address_book(
+        first_name, last_name, phone, email,
+        first_name_soundex, last_name_soundex)
+    VALUES(?, ?, ?, ?, ?, ?)
     """
 SELECT_ALL = """
-    SELECT * FROM tbl_address_book
-    ORDER BY last_name desc
+    SELECT id, first_name, last_name, phone, email
+    FROM tbl_address_book
+    ORDER BY coalesce(last_name, '') DESC, id DESC
+    """
+# {column} is one of the SORT_EXPRESSIONS, the sort direction is
+# checked before it is formatted into the query
+SELECT_ORDERED = """
+    SELECT id, first_name, last_name, phone, email
+    FROM tbl_address_book
+    ORDER BY {column} {direction}, id {direction}
+    """
+# Keyset (seek) pagination, the first page and every page after it
+# Seeking past the last (column, id) seen costs the same on any page
+SELECT_PAGE_FIRST = """
+    SELECT id, first_name, last_name, phone, email
+    FROM tbl_address_book
+    ORDER BY {column} {direction}, id {direction}
+    LIMIT ?
+    """
+# Jump straight to a row number, used when the scrollbar is dragged
+SELECT_WINDOW = """
+    SELECT id, first_name, last_name, phone, email
+    FROM tbl_address_book
+    ORDER BY {column} {direction}, id {direction}
+    LIMIT ? OFFSET ?
+    """
+COUNT_RECORDS = """
+    SELECT COUNT(*) FROM tbl_address_book
+    """
+# Row number of a record in the sorted list, counted
+# on the (column, id) index up to the record's key
+# (column, id) > (value, id) is written out, a row value
+# can't seek an index on an expression. The first term is the
+# index range, the second only checks rows with an equal value
+COUNT_BEFORE = """
+    SELECT COUNT(*) FROM tbl_address_book
+    WHERE {column} {operator}= ?
+    AND ({column} {operator} ? OR id {operator} ?)
+    """
+SELECT_PAGE_AFTER = """
+    SELECT id, first_name, last_name, phone, email
+    FROM tbl_address_book
+    WHERE {column} {operator}= ?
+    AND ({column} {operator} ? OR id {operator} ?)
+    ORDER BY {column} {direction}, id {direction}
+    LIMIT ?
+    """
+FIND_BY_EMAIL = """
+    SELECT id, first_name, last_name, phone, email
+    FROM tbl_address_book
+    WHERE email = ? COLLATE NOCASE
+    """
+# Which of a JSON list of emails are in the address book
+FIND_EMAILS = """
+    SELECT email
+    FROM tbl_address_book
+    WHERE email COLLATE NOCASE IN (SELECT value FROM json_each(?))
+    """
+FIND_BY_PHONE = f"""
+    SELECT id, first_name, last_name, phone, email
+    FROM tbl_address_book
+    WHERE {PHONE_DIGITS} = ?
+    """
+# Best bm25 matches first, the snippet shows the matching text
+# with the matched words in [brackets]
+SEARCH = """
+    SELECT a.id, a.first_name, a.last_name, a.phone, a.email,
+    snippet(fts_address_book, -1, '[', ']', '...', 8)
+    FROM fts_address_book
+    JOIN tbl_address_book AS a ON a.id = fts_address_book.rowid
+    WHERE fts_address_book MATCH ?
+    ORDER BY rank
+    LIMIT ?
+    """
+SELECT_BY_ID = """
+    SELECT id, first_name, last_name, phone, email
+    FROM tbl_address_book
+    WHERE id = ?
+    """
+# The ids are passed as one JSON array parameter
+SELECT_BY_IDS = """
+    SELECT id, first_name, last_name, phone, email
+    FROM tbl_address_book
+    WHERE id IN (SELECT value FROM json_each(?))
+    """
+# Values loaded into the in memory prefix index
+SELECT_PREFIX_VALUES = """
+    SELECT id, {field} FROM tbl_address_book
+    """
+# Prefix search in SQL when the prefix index is over its memory budget
+# LIKE is not case sensitive and uses the COLLATE NOCASE index
+SELECT_PREFIX_LIKE = """
+    SELECT id, first_name, last_name, phone, email
+    FROM tbl_address_book
+    WHERE {field} LIKE ? ESCAPE '\\'
+    LIMIT ?
+    """
+# Number of records containing each of a JSON list of trigrams
+TRIGRAM_COUNTS = """
+    SELECT term, doc
+    FROM fts_name_trigram_vocab
+    WHERE term IN (SELECT value FROM json_each(?))
+    """
+# Every record with one of the trigrams, when there are few enough
+# to check them all
+FUZZY_CANDIDATES = """
+    SELECT a.id, a.first_name, a.last_name, a.phone, a.email
+    FROM fts_name_trigram
+    JOIN tbl_address_book AS a ON a.id = fts_name_trigram.rowid
+    WHERE fts_name_trigram MATCH ?
+    LIMIT ?
+    """
+# Records sharing the most trigrams with the name come first
+# Ranking reads every match, it is only used when there are more
+# than can be checked
+FUZZY_RANKED_CANDIDATES = """
+    SELECT a.id, a.first_name, a.last_name, a.phone, a.email
+    FROM fts_name_trigram
+    JOIN tbl_address_book AS a ON a.id = fts_name_trigram.rowid
+    WHERE fts_name_trigram MATCH ?
+    ORDER BY rank
+    LIMIT ?
+    """
+# Sounds like search on one name, or on first and last name
+SEARCH_PHONETIC = """
+    SELECT id, first_name, last_name, phone, email
+    FROM tbl_address_book
+    WHERE {name_field}_soundex = ?
+    ORDER BY {name_field}, id
+    LIMIT ?
+    """
+SEARCH_PHONETIC_FULL_NAME = """
+    SELECT id, first_name, last_name, phone, email
+    FROM tbl_address_book
+    WHERE last_name_soundex = ? AND first_name_soundex = ?
+    ORDER BY last_name, id
+    LIMIT ?
+    """
+# Back fill the phonetic keys of existing records a batch at a time
+# Filled in keys are never NULL, so each batch finds the next records
+SELECT_MISSING_PHONETIC = """
+    SELECT id, first_name, last_name
+    FROM tbl_address_book
+    WHERE last_name_soundex IS NULL
+    LIMIT ?
+    """
+UPDATE_PHONETIC = """
+    UPDATE tbl_address_book
+    SET first_name_soundex = ?,
+    last_name_soundex = ?
+    WHERE id = ?
+    """
+# Everything the duplicate finder compares, read once in one pass
+SELECT_DEDUPE_RECORDS = """
+    SELECT id, first_name, last_name, phone, email, last_name_soundex
+    FROM tbl_address_book
+    """
+# A new duplicate search replaces suggestions nobody has reviewed
+# Dismissed pairs stay, so INSERT OR IGNORE does not suggest them again
+DELETE_NEW_SUGGESTIONS = """
+    DELETE FROM tbl_merge_suggestion WHERE status = 'new'
+    """
+INSERT_SUGGESTION = """
+    INSERT OR IGNORE INTO tbl_merge_suggestion(
+        keep_id, merge_id, score, reason)
+    VALUES(?, ?, ?, ?)
+    """
+SELECT_SUGGESTIONS = """
+    SELECT s.id, s.score, s.reason,
+    k.id, k.first_name, k.last_name, k.phone, k.email,
+    m.id, m.first_name, m.last_name, m.phone, m.email
+    FROM tbl_merge_suggestion AS s
+    JOIN tbl_address_book AS k ON k.id = s.keep_id
+    JOIN tbl_address_book AS m ON m.id = s.merge_id
+    WHERE s.status = ?
+    ORDER BY s.score DESC
+    LIMIT ?
+    """
+SELECT_SUGGESTION = """
+    SELECT keep_id, merge_id FROM tbl_merge_suggestion WHERE id = ?
+    """
+UPDATE_SUGGESTION_STATUS = """
+    UPDATE tbl_merge_suggestion SET status = ? WHERE id = ?
     """
 UPDATE_RECORD = """
     UPDATE tbl_address_book
     SET first_name = ?,
     last_name = ?,
     phone = ?,
-    email = ?
+    email = ?,
+    first_name_soundex = ?,
+    last_name_soundex = ?
     WHERE id = ?
     """
 DELETE_RECORD = """
@@ -41,9 +399,620 @@ DELETE_RECORD = """
     """
 
 
+# Columns the contact list can be sorted by
+SORT_COLUMNS = ("id", "first_name", "last_name", "phone", "email")
+# What each column sorts by in SQL. NULL sorts as "", like sort_key(),
+# so a (value, id) page key always compares, (NULL, id) > (?, ?)
+# would be NULL and the next page would be empty
+SORT_EXPRESSIONS = {
+    column: column if column == "id" else f"coalesce({column}, '')"
+    for column in SORT_COLUMNS
+}
+# Columns with as-you-type prefix filtering
+PREFIX_FIELDS = ("first_name", "last_name", "email")
+# Columns with a sounds like phonetic key
+PHONETIC_FIELDS = ("first_name", "last_name")
+
+
+def page_key(record: tuple, order_by: str = "last_name") -> tuple:
+    """Return the (column value, id) key to pass to fetch_page
+       to get the page after this record"""
+    return sort_key(record, order_by)
+
+
+def sort_key(record: tuple, order_by: str = "last_name") -> tuple:
+    """Return a (column value, id) key that sorts records in Python
+       the same way ORDER BY column, id sorts them in SQL"""
+    value = record[SORT_COLUMNS.index(order_by)]
+    # Python can't compare None, NULL sorts first in SQL
+    return ("" if value is None else value, record[0])
+
+
+def normalize_phone(phone: str) -> str:
+    """Remove the same punctuation as the PHONE_DIGITS expression"""
+    for character in PHONE_PUNCTUATION:
+        phone = phone.replace(character, "")
+    return phone
+
+
+def search_query(text: str) -> str:
+    """Turn what the user typed into an FTS5 query
+       Every word must match, as a prefix, in any column"""
+    # Quote each word so characters like @ - . " are not
+    # read as FTS5 query syntax
+    words = text.replace('"', " ").split()
+    return " ".join(f'"{word}"*' for word in words)
+
+
+def edit_distance(a: str, b: str, max_distance: int = None) -> int:
+    """Levenshtein distance, the number of single letter inserts,
+       deletes and changes to turn a into b
+       Stops early and returns max_distance + 1 once it is exceeded"""
+    if max_distance is not None and abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    # Only the previous row of the distance table is kept
+    previous = list(range(len(b) + 1))
+    for i, letter_a in enumerate(a, 1):
+        current = [i]
+        for j, letter_b in enumerate(b, 1):
+            current.append(min(
+                previous[j] + 1,  # Delete
+                current[j - 1] + 1,  # Insert
+                previous[j - 1] + (letter_a != letter_b)  # Change
+            ))
+        if max_distance is not None and min(current) > max_distance:
+            return max_distance + 1
+        previous = current
+    return previous[-1]
+
+
+# Soundex digit for each consonant, vowels and H W Y have none
+SOUNDEX_CODES = {
+    letter: digit
+    for letters, digit in (
+        ("BFPV", "1"), ("CGJKQSXZ", "2"), ("DT", "3"),
+        ("L", "4"), ("MN", "5"), ("R", "6"),
+    )
+    for letter in letters
+}
+
+
+def soundex(name: str) -> str:
+    """American Soundex key, names that sound alike get the same key
+       "Robert" and "Rupert" are both R163"""
+    letters = [
+        letter for letter in (name or "").upper()
+        if "A" <= letter <= "Z"
+    ]
+    if not letters:
+        return ""
+    key = letters[0]
+    last_code = SOUNDEX_CODES.get(letters[0], "")
+    for letter in letters[1:]:
+        code = SOUNDEX_CODES.get(letter, "")
+        # Skip a letter with the same digit as the one before it
+        if code and code != last_code:
+            key += code
+        # H and W don't separate letters with the same digit
+        if letter not in "HW":
+            last_code = code
+    # Pad with zeros, always one letter and three digits
+    return (key + "000")[:4]
+
+
+# Most records a fuzzy search checks letter by letter, about 40 us each
+FUZZY_MAX_ROWS = 1000
+
+
+def name_trigrams(name: str) -> list:
+    """Every 3 letter piece of the name in order, repeats included"""
+    return [name[i:i + 3] for i in range(len(name) - 2)]
+
+
+def covering_trigrams(
+    trigrams: list,
+    counts: dict,
+    max_distance: int
+) -> list:
+    """The rarest of a name's trigrams that every name max_distance
+       typos away shares at least one of, or None if the name is too
+       short for that. counts is the number of records with each
+       trigram
+       Each typo changes at most 3 trigrams, so trigrams that cover
+       3 * max_distance + 1 places in the name can't all be changed"""
+    # A trigram with a space spans the first and last name,
+    # which are indexed separately, so it may not be in the index
+    places = Counter(trigram for trigram in trigrams if " " not in trigram)
+    if sum(places.values()) <= 3 * max_distance:
+        return None
+    by_count = sorted(
+        places, key=lambda trigram: (counts.get(trigram, 0), trigram))
+    chosen = []
+    covered = 0
+    for trigram in by_count:
+        chosen.append(trigram)
+        covered += places[trigram]
+        if covered > 3 * max_distance:
+            break
+    return chosen
+
+
+def rarest_trigrams(trigrams: list, counts: dict, max_rows: int) -> list:
+    """The rarest of a name's trigrams that match at most max_rows
+       records between them"""
+    by_count = sorted(
+        set(trigrams), key=lambda trigram: (counts.get(trigram, 0), trigram))
+    chosen = []
+    rows = 0
+    for trigram in by_count:
+        rows += counts.get(trigram, 0)
+        if rows > max_rows:
+            break
+        chosen.append(trigram)
+    return chosen
+
+
+def trigram_query(trigrams: list) -> str:
+    """FTS5 query that matches any of the trigrams"""
+    # Double any quotes so every trigram is a quoted string
+    return " OR ".join(
+        '"{}"'.format(trigram.replace('"', '""'))
+        for trigram in sorted(trigrams)
+    )
+
+
+class FuzzyMatches(list):
+    """The records a fuzzy search found, a list like any other
+       complete is False when the name was too short or too common
+       to check every name close to it, closer names may exist"""
+
+    def __init__(self, records=(), complete: bool = True):
+        super().__init__(records)
+        self.complete = complete
+
+
+# ------------------------------ CSV ------------------------------------- #
+# Columns read from and written to CSV files, in this order
+# when a file has no header row
+CSV_COLUMNS = ("first_name", "last_name", "phone", "email")
+# Rows in each chunk parsed by a worker process
+CSV_CHUNK_ROWS = 5000
+# Longest value accepted in any column
+MAX_FIELD_LENGTH = 255
+# Only this many rejected row messages are kept
+MAX_CSV_ERRORS = 20
+EMAIL_PATTERN = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+
+
+def csv_columns(header: list) -> tuple:
+    """Index of each CSV_COLUMNS field in a header row, None for a
+       missing field, or None if the row is data, not a header"""
+    names = [name.strip().lower().replace(" ", "_") for name in header]
+    if not set(names) & set(CSV_COLUMNS):
+        return None
+    return tuple(
+        names.index(name) if name in names else None
+        for name in CSV_COLUMNS
+    )
+
+
+def validate_contact(values: list, columns: tuple):
+    """Return a (first_name, last_name, phone, email) row from the
+       values of a CSV row, or an error message"""
+    row = tuple(
+        values[index].strip()
+        if index is not None and index < len(values) else ""
+        for index in columns
+    )
+    first_name, last_name, phone, email = row
+    if not (first_name or last_name):
+        return "no name"
+    if any(len(value) > MAX_FIELD_LENGTH for value in row):
+        return f"value longer than {MAX_FIELD_LENGTH} characters"
+    if email and not EMAIL_PATTERN.match(email):
+        return f"bad email {email!r}"
+    digits = normalize_phone(phone)
+    if phone and not (digits.isdigit() and 7 <= len(digits) <= 15):
+        return f"bad phone {phone!r}"
+    return row
+
+
+def parse_csv_chunk(chunk: tuple) -> tuple:
+    """Worker process, parse and check the rows of a chunk of a file
+       Return the good rows, the number rejected and error messages"""
+    text, first_line, columns = chunk
+    rows = []
+    rejected = 0
+    errors = []
+    reader = csv.reader(io.StringIO(text, newline=""))
+    # A quoted value can go over several lines, errors give
+    # the line the row starts on
+    line = first_line
+    for values in reader:
+        row = validate_contact(values, columns) if values else None
+        if isinstance(row, str):
+            rejected += 1
+            if len(errors) < MAX_CSV_ERRORS:
+                errors.append(f"line {line}: {row}")
+        elif row is not None:
+            rows.append(row)
+        line = first_line + reader.line_num
+    return rows, rejected, errors
+
+
+def csv_chunks(file, columns: tuple, first_line: int):
+    """Split an open CSV file into (text, first_line, columns) chunks
+       of about CSV_CHUNK_ROWS rows, never inside a quoted value"""
+    lines = []
+    quotes = 0
+    for line in file:
+        lines.append(line)
+        # An odd number of quotes so far is inside a quoted
+        # value that goes on to the next line
+        quotes += line.count('"')
+        if len(lines) >= CSV_CHUNK_ROWS and quotes % 2 == 0:
+            yield "".join(lines), first_line, columns
+            first_line += len(lines)
+            lines = []
+            quotes = 0
+    if lines:
+        yield "".join(lines), first_line, columns
+
+
+def sql_statements():
+    """Yield (name, SQL) for every query constant in this module
+       Templates are expanded for every sort column and direction"""
+    for name, SQL in globals().items():
+        if not name.isupper() or not isinstance(SQL, str):
+            continue
+        # Only queries have a query plan, skip CREATE statements
+        if SQL.split()[0].upper() not in (
+                "SELECT", "INSERT", "UPDATE", "DELETE"):
+            continue
+        fields = {
+            field for _, field, _, _ in string.Formatter().parse(SQL)
+            if field
+        }
+        # The values each template field can take
+        choices = {
+            "column": tuple(SORT_EXPRESSIONS.values()),
+            "field": PREFIX_FIELDS,
+            "direction": (("ASC", ">"), ("DESC", "<")),
+            "table": SEARCH_TABLES,
+            "name_field": PHONETIC_FIELDS,
+            "name": PHONETIC_COLUMNS,
+            "operator": ("<", ">"),
+        }
+        if "direction" in fields:
+            # The direction sets the operator
+            fields.discard("operator")
+        names = [name for name in choices if name in fields]
+        for values in product(*(choices[name] for name in names)):
+            template = dict(zip(names, values))
+            # operator goes with direction
+            if "direction" in template:
+                template["direction"], template["operator"] = (
+                    template["direction"])
+            label = " ".join([name, *(
+                template[name] for name in names)])
+            yield label, SQL.format(**template)
+
+
+# ------------------------- DATABASE CONFIG ------------------------------ #
+class DatabaseConfig:
+    """Connection settings for several programs sharing one database"""
+
+    def __init__(
+        self,
+        journal_mode: str = "WAL",
+        synchronous: str = "NORMAL",
+        cache_size: int = -16_000,
+        mmap_size: int = 64 * 1024 * 1024,
+        temp_store: str = "MEMORY",
+        busy_timeout: int = 5000,
+        busy_retries: int = 5,
+        retry_delay: float = 0.05,
+        auto_vacuum: str = "INCREMENTAL"
+    ):
+        # WAL lets readers keep reading while one program writes
+        # NORMAL only syncs the WAL at checkpoints, still safe
+        # after a crash, a power cut can lose the last commits
+        self.journal_mode = journal_mode
+        self.synchronous = synchronous
+        # Negative is KiB, 16 MB of page cache per connection
+        self.cache_size = cache_size
+        # Bytes of the file read through memory mapping, 0 is off
+        self.mmap_size = mmap_size
+        # Temporary tables and sort space in memory or on disk
+        self.temp_store = temp_store
+        # Milliseconds SQLite waits for another program's lock
+        self.busy_timeout = busy_timeout
+        # SQLite doesn't wait when waiting could deadlock, like a
+        # read upgrading to a write, so try again a few times with
+        # a growing delay in seconds instead of failing
+        self.busy_retries = busy_retries
+        self.retry_delay = retry_delay
+        # INCREMENTAL keeps free pages in the file until
+        # reclaim_space() gives them back, a few at a time
+        # Only a new database or a full vacuum() can change it
+        self.auto_vacuum = auto_vacuum
+
+    def pragmas(self) -> dict:
+        """The PRAGMAs to run on each new connection, in order"""
+        return {
+            # Wait for locks while changing the journal mode too
+            "busy_timeout": self.busy_timeout,
+            # Before journal_mode, which writes the first page
+            # of a new database and fixes auto_vacuum
+            "auto_vacuum": self.auto_vacuum,
+            "journal_mode": self.journal_mode,
+            "synchronous": self.synchronous,
+            "cache_size": self.cache_size,
+            "mmap_size": self.mmap_size,
+            "temp_store": self.temp_store,
+            "foreign_keys": "ON",
+        }
+
+
+def is_busy(error: Exception) -> bool:
+    """True if an sqlite3 error is the database being locked"""
+    # Extended codes like SQLITE_BUSY_SNAPSHOT keep the
+    # primary code in the low byte
+    code = getattr(error, "sqlite_errorcode", None)
+    if code is not None:
+        return code & 0xFF in (sqlite3.SQLITE_BUSY, sqlite3.SQLITE_LOCKED)
+    return "locked" in str(error) or "busy" in str(error)
+
+
+# Default files for database_dump() and backup()
+DUMP_FILE = "database_dump.sql"
+BACKUP_FILE = "address_book_backup.db"
+# Pages copied per backup step and seconds to sleep between steps,
+# 256 pages of 4 KB is 1 MB, a 1 GB database takes about 10 s
+BACKUP_PAGES = 256
+BACKUP_SLEEP = 0.01
+# auto_vacuum values returned by PRAGMA auto_vacuum
+AUTO_VACUUM_MODES = ("none", "full", "incremental")
+# Free pages reclaim_space() gives back per transaction
+VACUUM_SLICE = 256
+
+# database_dump() and restore_dump() report progress
+# every this many lines or statements
+PROGRESS_LINES = 10_000
+# Transaction lines iterdump() writes, restore_dump() runs
+# the whole dump in a transaction of its own instead
+DUMP_TRANSACTION = ("BEGIN TRANSACTION;", "BEGIN;", "COMMIT;")
+# PRAGMAs for loading a dump into an empty database, nothing
+# is lost if it crashes part way, the restore is just run again
+RESTORE_PRAGMAS = {
+    "synchronous": "OFF",
+    "cache_size": -256_000,
+    "temp_store": "MEMORY",
+    "foreign_keys": "OFF",
+}
+
+
+# Table a dump statement writes to, the name of a virtual
+# table is in the sqlite_master row iterdump() inserts
+DUMP_TABLE = re.compile(r"""(?:INSERT INTO|CREATE TABLE) ["']?(\w+)""")
+DUMP_SCHEMA = re.compile(r"VALUES\('table','(\w+)'")
+
+
+def is_search_dump(statement: str) -> bool:
+    """True if an iterdump() statement is for a full text index
+       Its virtual table, shadow tables (fts_..._data) and rows
+       can't be loaded back, create_table() rebuilds them instead"""
+    match = DUMP_TABLE.match(statement)
+    if match is None:
+        return False
+    name = match.group(1)
+    if name == "sqlite_master":
+        match = DUMP_SCHEMA.search(statement)
+        if match is None:
+            return False
+        name = match.group(1)
+    return name.startswith(SEARCH_TABLES)
+
+
+def open_dump(path: str, mode: str = "r"):
+    """Open a dump file as text, compressed by its extension
+       .gz is gzip, .xz is lzma and .zst is zstd (Python 3.14)"""
+    if path.endswith(".gz"):
+        # Level 6 is nearly as small as 9 and much faster
+        return gzip.open(
+            path, mode + "t", compresslevel=6, encoding="utf-8")
+    if path.endswith((".xz", ".lzma")):
+        return lzma.open(path, mode + "t", encoding="utf-8")
+    if path.endswith(".zst"):
+        if zstd is None:
+            raise ValueError("zstd needs Python 3.14 or newer")
+        return zstd.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+# PRAGMAs applied to every new pooled connection
+DEFAULT_PRAGMAS = DatabaseConfig().pragmas()
+
+
+class ConnectionPool:
+    """Reusable pool of SQLite connections shared between threads"""
+
+    def __init__(
+        self,
+        database: str,
+        pool_size: int = 5,
+        pragmas: dict = None,
+        timeout: float = 10.0
+    ):
+        self.database = database
+        self.pool_size = pool_size
+        self.pragmas = DEFAULT_PRAGMAS if pragmas is None else pragmas
+        # How long to wait for a free connection before giving up
+        self.timeout = timeout
+        # Idle connections waiting to be checked out
+        self._idle = queue.LifoQueue(maxsize=pool_size)
+        # Number of connections opened so far, guarded by the lock
+        self._created = 0
+        self._lock = threading.Lock()
+        self._closed = False
+
+# ------------------------ OPEN CONNECTION ------------------------------- #
+    def _open(self):
+        """Open a new connection and apply the PRAGMAs"""
+        # check_same_thread=False lets a connection move between threads
+        # The pool makes sure only one thread uses it at a time
+        connection = sqlite3.connect(
+            self.database,
+            check_same_thread=False
+        )
+        for name, value in self.pragmas.items():
+            connection.execute(f"PRAGMA {name} = {value}")
+        return connection
+
+# ------------------------ HEALTH CHECK ---------------------------------- #
+    def _is_healthy(self, connection) -> bool:
+        """Make sure a pooled connection still works before handing it out"""
+        try:
+            connection.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+# ------------------------ ACQUIRE CONNECTION ---------------------------- #
+    def acquire(self):
+        """Check a connection out of the pool"""
+        if self._closed:
+            raise sqlite3.ProgrammingError("Connection pool is closed")
+
+        # Reuse an idle connection if there is one
+        try:
+            connection = self._idle.get_nowait()
+        except queue.Empty:
+            connection = None
+
+        # Open a new connection if the pool is not full yet
+        if connection is None:
+            with self._lock:
+                if self._created < self.pool_size:
+                    self._created += 1
+                    create = True
+                else:
+                    create = False
+            if create:
+                try:
+                    return self._open()
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+            # Every connection is in use, wait for one to be released
+            try:
+                connection = self._idle.get(timeout=self.timeout)
+            except queue.Empty:
+                raise sqlite3.OperationalError(
+                    "Timed out waiting for a pooled connection")
+
+        # Replace a broken connection with a fresh one
+        if not self._is_healthy(connection):
+            try:
+                connection.close()
+            except sqlite3.Error:
+                pass
+            connection = self._open()
+        return connection
+
+# ------------------------ RELEASE CONNECTION ---------------------------- #
+    def release(self, connection):
+        """Return a connection to the pool"""
+        # Never hand out a connection with a half finished transaction
+        if connection.in_transaction:
+            connection.rollback()
+        if self._closed:
+            connection.close()
+            with self._lock:
+                self._created -= 1
+        else:
+            self._idle.put_nowait(connection)
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection for the length of a with statement"""
+        connection = self.acquire()
+        try:
+            yield connection
+        finally:
+            self.release(connection)
+
+# ------------------------ CLOSE POOL ------------------------------------ #
+    def close(self):
+        """Close all idle connections, busy ones close when released"""
+        self._closed = True
+        while True:
+            try:
+                connection = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            connection.close()
+            with self._lock:
+                self._created -= 1
+
+
 class DBOperations:
-    def __init__(self, database: str):
+    def __init__(
+        self,
+        database: str,
+        pool_size: int = 5,
+        pragmas: dict = None,
+        prefix_memory_budget: int = DEFAULT_MEMORY_BUDGET,
+        config: DatabaseConfig = None,
+        query_cache_budget: int = DEFAULT_CACHE_BUDGET
+    ):
         self.database = database
+        self.config = DatabaseConfig() if config is None else config
+        # pragmas adds to or replaces the config's PRAGMAs
+        all_pragmas = self.config.pragmas()
+        all_pragmas.update(pragmas or {})
+        # All methods borrow their connection from this pool
+        # instead of opening a new connection for every call
+        self.pool = ConnectionPool(database, pool_size, all_pragmas)
+
+        # Prefix indexes are loaded the first time a field is searched
+        # None means the field is over budget and SQL is used instead
+        self.prefix_memory_budget = prefix_memory_budget
+        self.prefix_indexes = {}
+        self.prefix_lock = threading.Lock()
+
+        # Results of read queries, cleared by every write
+        # A budget of 0 turns the cache off
+        self.query_cache = QueryCache(query_cache_budget)
+        self.cache_lock = threading.Lock()
+        # Connection that reads PRAGMA data_version, which changes
+        # when any other connection commits, opened on the first
+        # check. Record writes the prefix indexes are updated for
+        # are made on it too, so they don't change data_version
+        self.version_connection = None
+        self.data_version = None
+
+# -------------------- CONNECTION LIFECYCLE ------------------------------ #
+    def close(self):
+        """Close every pooled connection"""
+        # Let SQLite refresh the statistics the indexes are planned with
+        try:
+            with self.pool.connection() as connection:
+                connection.execute("PRAGMA optimize")
+        except sqlite3.Error:
+            pass
+        self.pool.close()
+        with self.cache_lock:
+            if self.version_connection is not None:
+                self.version_connection.close()
+                self.version_connection = None
+            self.query_cache.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
 
 # -------------------- CREATE TABLE -------------------------------------- #
     def create_table(self):
@@ -55,6 +1024,37 @@ class DBOperations:
         # Create the address_book table if it doesn't exist
         self.execute_sql(CREATE_TABLE)
 
+        # Add the phonetic key columns to an older table
+        # then fill in the keys of records that don't have them
+        with self.pool.connection() as connection:
+            columns = {
+                row[1] for row in connection.execute(
+                    "PRAGMA table_info(tbl_address_book)")
+            }
+        for name in PHONETIC_COLUMNS:
+            if name not in columns:
+                self.execute_sql(ADD_COLUMN.format(name=name))
+        self.execute_sql(CREATE_PHONETIC_INDEXES)
+        self.backfill_phonetic_keys()
+
+        # Create the duplicate contact review table
+        self.execute_sql(CREATE_MERGE_SUGGESTIONS)
+
+        # Create the sort and pagination indexes if they don't exist
+        self.execute_sql(CREATE_INDEXES)
+
+        # Create the full text and trigram indexes and their triggers
+        # Index the existing records the first time they are created
+        with self.pool.connection() as connection:
+            existing = {
+                row[0] for row in connection.execute(
+                    "SELECT name FROM sqlite_master WHERE type = 'table'")
+            }
+        self.execute_sql(CREATE_SEARCH)
+        self.execute_sql(CREATE_TRIGRAM)
+        if not existing.issuperset(SEARCH_TABLES):
+            self.rebuild_search_index()
+
 # ------------------------- INSERT RECORD -------------------------------- #
     def insert_record(
         self,
@@ -62,17 +1062,154 @@ class DBOperations:
         last_name: str,
         phone: str,
         email: str
-    ):
-        """Insert new record"""
+    ) -> tuple:
+        """Insert new record
+           Return the new (id, first_name, last_name, phone, email)
+           so a view can add just this row, or None on error"""
         # Parameters are a tuple of variables or values
         # They are mapped to the ? ? placeholders of the query
         parameters = (
             first_name,
             last_name,
             phone,
-            email
+            email,
+            soundex(first_name),
+            soundex(last_name)
         )
-        self.execute_sql(INSERT_RECORD, parameters)
+        cursor = self.execute_indexed(INSERT_RECORD, parameters)
+
+        # Add the new record to the loaded prefix indexes
+        if cursor is None:
+            return None
+        self.update_prefix_indexes(
+            cursor.lastrowid, None, (first_name, last_name, email))
+        return (cursor.lastrowid, first_name, last_name, phone, email)
+
+# ------------------------- INSERT MANY ---------------------------------- #
+    def insert_many(
+        self,
+        rows,
+        batch_size: int = 5000,
+        progress=None
+    ) -> list:
+        """Bulk insert (first_name, last_name, phone, email) rows
+           in batched transactions, return the new ids"""
+        # rows can be any iterable, including a generator
+        # Only one batch is held in memory at a time
+        ids = []
+        total = 0
+        rows = iter(rows)
+        try:
+            with self.pool.connection() as connection:
+                cursor = connection.cursor()
+                while True:
+                    # Take the next batch of rows from the iterable
+                    # The phonetic keys are added to the end of each row
+                    batch = [
+                        (*row, soundex(row[0]), soundex(row[1]))
+                        for _, row in zip(range(batch_size), rows)
+                    ]
+                    if not batch:
+                        break
+                    # One transaction (and one disk sync) per batch
+                    def insert_batch():
+                        with connection:
+                            cursor.executemany(INSERT_RECORD, batch)
+                            # The write lock is held for the whole batch,
+                            # so the new ids are the block ending at
+                            # last_insert_rowid()
+                            return cursor.execute(
+                                "SELECT last_insert_rowid()").fetchone()[0]
+                    last_id = self.retry_busy(insert_batch)
+                    ids.extend(range(last_id - len(batch) + 1, last_id + 1))
+                    total += len(batch)
+                    # Let the caller know how many rows are done
+                    if progress is not None:
+                        progress(total)
+        finally:
+            # Rebuild the prefix indexes on the next search instead
+            # of adding a large batch one row at a time. Batches
+            # committed before one that failed are in the table too
+            with self.prefix_lock:
+                self.prefix_indexes.clear()
+            self.clear_query_cache()
+        return ids
+
+# ---------------------- CSV IMPORT / EXPORT ----------------------------- #
+    def import_csv(
+        self,
+        path: str,
+        workers: int = None,
+        progress=None
+    ) -> tuple:
+        """Import contacts from a CSV file of any size
+           Chunks are parsed and checked in a process pool and loaded
+           in batched transactions, a few chunks in memory at a time
+           progress(rows) is called after each chunk
+           Return (imported, rejected, error messages)"""
+        imported = 0
+        rejected = 0
+        errors = []
+        with open(path, newline="", encoding="utf-8-sig") as file:
+            # A file without a header row is in CSV_COLUMNS order
+            first = file.readline()
+            header = next(csv.reader([first]), [])
+            columns = csv_columns(header)
+            first_line = 2
+            if columns is None:
+                columns = tuple(range(len(CSV_COLUMNS)))
+                file.seek(0)
+                first_line = 1
+
+            workers = workers or os.cpu_count() or 1
+            with ProcessPoolExecutor(workers) as executor:
+                # Two chunks per worker keeps them busy while the
+                # last results are inserted, without reading ahead
+                # through the whole file
+                parsing = deque()
+                chunks = csv_chunks(file, columns, first_line)
+                while True:
+                    for chunk in chunks:
+                        parsing.append(
+                            executor.submit(parse_csv_chunk, chunk))
+                        if len(parsing) >= 2 * workers:
+                            break
+                    if not parsing:
+                        break
+                    rows, chunk_rejected, chunk_errors = (
+                        parsing.popleft().result())
+                    self.insert_many(rows)
+                    imported += len(rows)
+                    rejected += chunk_rejected
+                    errors.extend(
+                        chunk_errors[:MAX_CSV_ERRORS - len(errors)])
+                    if progress is not None:
+                        progress(imported)
+        return imported, rejected, errors
+
+    def export_csv(
+        self,
+        path: str,
+        order_by: str = "last_name",
+        progress=None
+    ) -> int:
+        """Write every contact to a CSV file with a header row
+           Rows go straight from the cursor to the file
+           progress(rows) is called every PROGRESS_LINES rows
+           Return the number of rows written"""
+        rows = 0
+        with open(path, "w", newline="", encoding="utf-8") as file:
+            writer = csv.writer(file)
+            writer.writerow(CSV_COLUMNS)
+            for record in self.iter_records(order_by):
+                # Leave out the id, an import gives new ids
+                writer.writerow(record[1:])
+                rows += 1
+                if progress is not None and rows % PROGRESS_LINES == 0:
+                    progress(rows)
+        if progress is not None:
+            progress(rows)
+        return rows
 
 # ---------------------- FETCH ALL RECORDS ------------------------------- #
     def fetch_all_records(self):
@@ -83,14 +1220,346 @@ class DBOperations:
         # desc (descending) order for GUI Treeview
         # asc (ascending) order for CLI
 
-        with sqlite3.connect(self.database) as connection:
-            cursor = connection.cursor()
-            # fetchall() fetches the records returned by the SQL
-            # statement as a list of tuples
-            records = cursor.execute(SELECT_ALL).fetchall()
+        # The records returned by the SQL statement as a list of
+        # tuples, from memory if nothing has changed since last time
+        records = self.cached_query(SELECT_ALL)
         if records:
             return records
 
+# ------------------------ ITERATE RECORDS ------------------------------- #
+    def iter_records(
+        self,
+        order_by: str = "last_name",
+        descending: bool = False,
+        chunk_size: int = 500
+    ):
+        """Generator that yields records one at a time in sorted order"""
+        # Only allow known column names in the ORDER BY clause
+        if order_by not in SORT_COLUMNS:
+            raise ValueError(f"Cannot sort by {order_by}")
+        SQL = SELECT_ORDERED.format(
+            column=SORT_EXPRESSIONS[order_by],
+            direction="DESC" if descending else "ASC"
+        )
+
+        # The connection stays checked out only while iterating
+        with self.pool.connection() as connection:
+            cursor = connection.execute(SQL)
+            try:
+                while True:
+                    # fetchmany() only pulls chunk_size rows into memory
+                    records = cursor.fetchmany(chunk_size)
+                    if not records:
+                        break
+                    yield from records
+            finally:
+                cursor.close()
+
+# ------------------------ FIND BY EMAIL / PHONE ------------------------- #
+    def find_by_email(self, email: str) -> list:
+        """Find records by email, ignoring case"""
+        return self.cached_query(FIND_BY_EMAIL, (email,))
+
+    def existing_emails(self, emails) -> set:
+        """The lower case emails from a list that are already
+           in the address book, ignoring case"""
+        emails = list(emails)
+        if not emails:
+            return set()
+        with self.pool.connection() as connection:
+            return {
+                row[0].lower() for row in connection.execute(
+                    FIND_EMAILS, (json.dumps(emails),))
+            }
+
+    def find_by_phone(self, phone: str) -> list:
+        """Find records by phone, ignoring punctuation"""
+        return self.cached_query(FIND_BY_PHONE, (normalize_phone(phone),))
+
+# ---------------------------- SEARCH ------------------------------------ #
+    def search(self, query: str, limit: int = 50) -> list:
+        """Full text search of all columns, best matches first
+           Each record has a highlighted snippet added to the end"""
+        match = search_query(query)
+        if not match:
+            return []
+        return self.cached_query(SEARCH, (match, limit))
+
+# ------------------------ SEARCH INDEX MAINTENANCE ---------------------- #
+    def rebuild_search_index(self):
+        """Rebuild the full text indexes from tbl_address_book"""
+        for table in SEARCH_TABLES:
+            self.execute_sql(REBUILD_SEARCH.format(table=table))
+
+    def optimize_search_index(self):
+        """Merge the full text indexes into one b-tree
+           each for faster searches"""
+        for table in SEARCH_TABLES:
+            self.execute_sql(OPTIMIZE_SEARCH.format(table=table))
+
+# -------------------------- FUZZY SEARCH -------------------------------- #
+    def fuzzy_search(
+        self,
+        name: str,
+        max_distance: int = 2,
+        limit: int = 20,
+        candidates: int = FUZZY_MAX_ROWS
+    ) -> list:
+        """Typo tolerant name search, "Lorring" finds "Loring"
+           Each record has its edit distance added to the end,
+           closest matches first
+           Return a FuzzyMatches list, complete is False when a name
+           max_distance typos away may have been missed"""
+        name = " ".join(name.lower().split())
+        if len(name) < 3:
+            # Too short to have a trigram
+            return FuzzyMatches([
+                record + (0,)
+                for record in self.prefix_search("last_name", name, limit)
+            ], complete=False)
+
+        trigrams = name_trigrams(name)
+        counts = dict(self.cached_query(
+            TRIGRAM_COUNTS, (json.dumps(sorted(set(trigrams))),)))
+        chosen = covering_trigrams(trigrams, counts, max_distance)
+        if chosen is None:
+            # A short name can have every trigram changed by the
+            # typos, so no trigrams find every close name. Search
+            # for the rarest that can all be checked, and for names
+            # that sound the same
+            complete = False
+            chosen = rarest_trigrams(trigrams, counts, candidates)
+            records = []
+            if chosen:
+                records = self.cached_query(
+                    FUZZY_CANDIDATES, (trigram_query(chosen), candidates))
+        elif sum(counts.get(trigram, 0) for trigram in chosen) <= candidates:
+            # Every record with the trigrams can be checked
+            complete = True
+            records = self.cached_query(
+                FUZZY_CANDIDATES, (trigram_query(chosen), candidates))
+        else:
+            # Too many to check, only the ones sharing the most
+            complete = False
+            records = self.cached_query(
+                FUZZY_RANKED_CANDIDATES, (trigram_query(chosen), candidates))
+        if not complete:
+            records += self.search_phonetic(name, candidates)
+
+        matches = {}
+        for order, record in enumerate(records):
+            first_name = (record[1] or "").lower()
+            last_name = (record[2] or "").lower()
+            distance = min(
+                edit_distance(name, first_name, max_distance),
+                edit_distance(name, last_name, max_distance),
+                edit_distance(
+                    name, f"{first_name} {last_name}", max_distance),
+            )
+            # A record found by trigram and by sound is listed once
+            if distance <= max_distance and record[0] not in matches:
+                matches[record[0]] = (distance, order, record)
+
+        # Closest first, ties in the order they were found
+        best = sorted(matches.values())
+        return FuzzyMatches(
+            [record + (distance,) for distance, _, record in best[:limit]],
+            complete=complete
+        )
+
+# ------------------------- PHONETIC SEARCH ------------------------------ #
+    def search_phonetic(self, name: str, limit: int = 50) -> list:
+        """Sounds like search, "Smyth" finds "Smith"
+           One word is matched against first and last names
+           Two or more words are matched as first name and last name"""
+        words = name.split()
+        if len(words) > 1:
+            return self.cached_query(
+                SEARCH_PHONETIC_FULL_NAME,
+                (soundex(words[-1]), soundex(words[0]), limit)
+            )
+        if not words:
+            return []
+
+        # Last name matches first, then first name matches
+        key = soundex(words[0])
+        records = []
+        for field in ("last_name", "first_name"):
+            records.extend(self.cached_query(
+                SEARCH_PHONETIC.format(name_field=field),
+                (key, limit)
+            ))
+        # A record can match on both names, only list it once
+        unique = list({record[0]: record for record in records}.values())
+        return unique[:limit]
+
+    def backfill_phonetic_keys(self, batch_size: int = 5000):
+        """Add phonetic keys to records that don't have them,
+           one transaction per batch"""
+        with self.pool.connection() as connection:
+            while True:
+                records = connection.execute(
+                    SELECT_MISSING_PHONETIC, (batch_size,)
+                ).fetchall()
+                if not records:
+                    break
+                with connection:
+                    connection.executemany(UPDATE_PHONETIC, [
+                        (soundex(first_name), soundex(last_name), id)
+                        for id, first_name, last_name in records
+                    ])
+
+# ------------------------ MERGE SUGGESTIONS ----------------------------- #
+    def save_merge_suggestions(self, suggestions) -> int:
+        """Replace the unreviewed suggestions with
+           (keep_id, merge_id, score, reason) rows"""
+        with self.pool.connection() as connection, connection:
+            connection.execute(DELETE_NEW_SUGGESTIONS)
+            cursor = connection.executemany(INSERT_SUGGESTION, suggestions)
+        self.clear_query_cache()
+        return cursor.rowcount
+
+    def fetch_merge_suggestions(
+        self,
+        status: str = "new",
+        limit: int = 100
+    ) -> list:
+        """Possible duplicates, most likely first
+           Each row is the suggestion id, score, reason,
+           then the record to keep and the record to merge into it"""
+        return self.cached_query(SELECT_SUGGESTIONS, (status, limit))
+
+    def dismiss_merge_suggestion(self, id: int):
+        """The two records are not duplicates, don't suggest them again"""
+        self.execute_sql(UPDATE_SUGGESTION_STATUS, ("dismissed", id))
+
+    def accept_merge_suggestion(self, id: int) -> tuple:
+        """Merge the newer record into the older one, blank fields of
+           the older record are filled from the newer one, then the
+           newer record is deleted
+           Return the merged (id, first_name, last_name, phone, email)
+           or None if the suggestion or its records are gone"""
+        def merge(connection):
+            # Lock the database before reading, so the records
+            # written are the ones read
+            connection.execute("BEGIN IMMEDIATE")
+            suggestion = connection.execute(
+                SELECT_SUGGESTION, (id,)).fetchone()
+            if suggestion is None:
+                return None
+            keep_id, merge_id = suggestion
+            keep = connection.execute(SELECT_BY_ID, (keep_id,)).fetchone()
+            duplicate = connection.execute(
+                SELECT_BY_ID, (merge_id,)).fetchone()
+            if keep is None or duplicate is None:
+                return None
+            first_name, last_name, phone, email = (
+                value if value else other
+                for value, other in zip(keep[1:], duplicate[1:])
+            )
+            connection.execute(UPDATE_RECORD, (
+                first_name,
+                last_name,
+                phone,
+                email,
+                soundex(first_name),
+                soundex(last_name),
+                keep_id
+            ))
+            # The suggestion itself is removed by ON DELETE CASCADE
+            connection.execute(DELETE_RECORD, (merge_id,))
+            return keep, duplicate, (
+                keep_id, first_name, last_name, phone, email)
+
+        merged = self.write_indexed(merge)
+        if merged is None:
+            return None
+        keep, duplicate, record = merged
+        # Prefix index values are (first_name, last_name, email)
+        self.update_prefix_indexes(
+            keep[0], (keep[1], keep[2], keep[4]),
+            (record[1], record[2], record[4]))
+        self.update_prefix_indexes(
+            duplicate[0], (duplicate[1], duplicate[2], duplicate[4]), None)
+        return record
+
+# -------------------------- FETCH PAGE ---------------------------------- #
+    def fetch_page(
+        self,
+        after_key: tuple = None,
+        limit: int = 50,
+        order_by: str = "last_name",
+        direction: str = "asc"
+    ) -> list:
+        """Fetch one page of records sorted by order_by, id
+           starting after the (value, id) key of the previous page"""
+        # Only allow known column names and directions in the query
+        if order_by not in SORT_COLUMNS:
+            raise ValueError(f"Cannot sort by {order_by}")
+        direction = direction.upper()
+        if direction not in ("ASC", "DESC"):
+            raise ValueError(f"Unknown sort direction {direction}")
+
+        if after_key is None:
+            # First page
+            SQL = SELECT_PAGE_FIRST.format(
+                column=SORT_EXPRESSIONS[order_by], direction=direction)
+            parameters = (limit,)
+        else:
+            # Seek past the last row of the previous page
+            SQL = SELECT_PAGE_AFTER.format(
+                column=SORT_EXPRESSIONS[order_by],
+                direction=direction,
+                operator=">" if direction == "ASC" else "<"
+            )
+            value, id = after_key
+            parameters = (value, value, id, limit)
+
+        return self.cached_query(SQL, parameters)
+
+# ------------------------- FETCH WINDOW --------------------------------- #
+    def fetch_window(
+        self,
+        offset: int,
+        limit: int = 50,
+        order_by: str = "last_name",
+        direction: str = "asc"
+    ) -> list:
+        """Fetch limit records starting at row number offset
+           Use fetch_page to move a page at a time, this is for jumps"""
+        if order_by not in SORT_COLUMNS:
+            raise ValueError(f"Cannot sort by {order_by}")
+        direction = direction.upper()
+        if direction not in ("ASC", "DESC"):
+            raise ValueError(f"Unknown sort direction {direction}")
+        SQL = SELECT_WINDOW.format(
+            column=SORT_EXPRESSIONS[order_by], direction=direction)
+        return self.cached_query(SQL, (limit, offset))
+
+    def record_position(
+        self,
+        record: tuple,
+        order_by: str = "last_name",
+        direction: str = "asc"
+    ) -> int:
+        """Return the row number of a record in the list sorted by
+           order_by, id, so a view can insert it in place"""
+        if order_by not in SORT_COLUMNS:
+            raise ValueError(f"Cannot sort by {order_by}")
+        direction = direction.upper()
+        if direction not in ("ASC", "DESC"):
+            raise ValueError(f"Unknown sort direction {direction}")
+        SQL = COUNT_BEFORE.format(
+            column=SORT_EXPRESSIONS[order_by],
+            operator="<" if direction == "ASC" else ">"
+        )
+        value, id = page_key(record, order_by)
+        return self.cached_query(SQL, (value, value, id))[0][0]
+
+    def count_records(self) -> int:
+        """Number of records in the address book"""
+        return self.cached_query(COUNT_RECORDS)[0][0]
+
 # ---------------------- UPDATE RECORD ----------------------------------- #
     def update_record(
         self,
@@ -99,8 +1568,13 @@ class DBOperations:
         phone: str,
         email: str,
         id: int
-    ):
-        """Update selected record by id"""
+    ) -> tuple:
+        """Update selected record by id
+           Return the updated (id, first_name, last_name, phone, email)
+           or None if there was no record to update"""
+        # The treeview passes the id back as text, the prefix
+        # indexes hold int ids
+        id = int(id)
 
         # Parameters are a tuple of variables or values
         # They are mapped to the ? ? ? ? ? in the query
@@ -109,46 +1583,356 @@ class DBOperations:
             last_name,
             phone,
             email,
+            soundex(first_name),
+            soundex(last_name),
             id
         )
-        self.execute_sql(UPDATE_RECORD, parameters)
+        old_values = self.fetch_prefix_values(id)
+        cursor = self.execute_indexed(UPDATE_RECORD, parameters)
+
+        if cursor is None or cursor.rowcount == 0:
+            return None
+        # Move the record to its new place in the prefix indexes
+        self.update_prefix_indexes(
+            id, old_values, (first_name, last_name, email))
+        return (id, first_name, last_name, phone, email)
 
 # ---------------------- DELETE RECORD ----------------------------------- #
-    def delete_record(self, id: int):
-        """Delete selected record by id"""
+    def delete_record(self, id: int) -> int:
+        """Delete selected record by id
+           Return the id deleted, or None if there was no record"""
+        # The treeview passes the id back as text
+        id = int(id)
         # Parameters are a tuple of variables or values
         # They are mapped to the ? in the query
         parameters = (
             id,
         )
-        self.execute_sql(DELETE_RECORD, parameters)
+        old_values = self.fetch_prefix_values(id)
+        cursor = self.execute_indexed(DELETE_RECORD, parameters)
+
+        if cursor is None or cursor.rowcount == 0:
+            return None
+        # Remove the record from the prefix indexes
+        self.update_prefix_indexes(id, old_values, None)
+        return id
+
+# ------------------------ PREFIX SEARCH --------------------------------- #
+    def prefix_search(
+        self,
+        field: str,
+        prefix: str,
+        limit: int = 20
+    ) -> list:
+        """Return up to limit records where field starts with prefix
+           Used for as-you-type filtering"""
+        if field not in PREFIX_FIELDS:
+            raise ValueError(f"No prefix search on {field}")
+        if not prefix:
+            return []
+
+        # Drop the indexes if another connection changed the records
+        with self.cache_lock:
+            self.check_data_version()
+        with self.prefix_lock:
+            index = self.load_prefix_index(field)
+            if index is not None:
+                ids = index.match(prefix, limit)
+
+        if index is None:
+            # Over the memory budget, let SQLite do the work
+            # Escape the LIKE wildcards the user may have typed
+            pattern = (
+                prefix.replace("\\", "\\\\")
+                .replace("%", "\\%")
+                .replace("_", "\\_")
+            ) + "%"
+            return self.cached_query(
+                SELECT_PREFIX_LIKE.format(field=field), (pattern, limit))
+
+        # Look the matching records up by primary key
+        records = self.cached_query(
+            SELECT_BY_IDS, (json.dumps(list(ids)),))
+        # Return them in prefix index order
+        position = {id: i for i, id in enumerate(ids)}
+        records.sort(key=lambda record: position[record[0]])
+        return records
+
+# ------------------------ PREFIX INDEX MAINTENANCE ---------------------- #
+    def load_prefix_index(self, field: str):
+        """Return the prefix index for field, loading it the first time
+           Call with prefix_lock held"""
+        if field not in self.prefix_indexes:
+            index = PrefixIndex(self.prefix_memory_budget)
+            try:
+                with self.pool.connection() as connection:
+                    index.load(connection.execute(
+                        SELECT_PREFIX_VALUES.format(field=field)))
+            except MemoryBudgetExceeded:
+                index = None
+            self.prefix_indexes[field] = index
+        return self.prefix_indexes[field]
+
+    def fetch_prefix_values(self, id: int):
+        """Return the indexed (first_name, last_name, email) of a record
+           before it changes, or None if no prefix index is loaded"""
+        if all(index is None for index in self.prefix_indexes.values()):
+            return None
+        with self.pool.connection() as connection:
+            record = connection.execute(SELECT_BY_ID, (id,)).fetchone()
+        if record is not None:
+            return (record[1], record[2], record[4])
+
+    def update_prefix_indexes(self, id: int, old_values, new_values):
+        """Replace a record's old values with its new values
+           in every loaded prefix index, None means no values"""
+        with self.prefix_lock:
+            for field, index in list(self.prefix_indexes.items()):
+                if index is None:
+                    continue
+                column = PREFIX_FIELDS.index(field)
+                try:
+                    if old_values is not None:
+                        index.remove(id, old_values[column])
+                    if new_values is not None:
+                        index.add(id, new_values[column])
+                except MemoryBudgetExceeded:
+                    # Switch this field to SQL prefix searches
+                    self.prefix_indexes[field] = None
+
+# ------------------------ EXPLAIN QUERY PLANS --------------------------- #
+    def explain_query_plans(self) -> list:
+        """Run EXPLAIN QUERY PLAN on every SQL constant in this module
+           Return a list of (name, plan detail, flagged) tuples
+           Temp B-tree sorts and table scans that filter rows
+           with a WHERE clause are flagged"""
+        results = []
+        with self.pool.connection() as connection:
+            for name, SQL in sql_statements():
+                # Listing the whole table has to read every row,
+                # a scan is only a problem when looking rows up
+                has_where = " WHERE " in f" {' '.join(SQL.split())} ".upper()
+                # Bind a sample prefix pattern to every ? placeholder
+                # so LIKE can plan an index range, nothing is executed
+                parameters = ("a%",) * SQL.count("?")
+                plan = connection.execute(
+                    f"EXPLAIN QUERY PLAN {SQL}", parameters).fetchall()
+                for row in plan:
+                    detail = row[-1]
+                    table_scan = (
+                        detail.startswith("SCAN") and "INDEX" not in detail
+                    )
+                    flagged = (
+                        "TEMP B-TREE" in detail
+                        or (table_scan and has_where)
+                    )
+                    results.append((name, detail, flagged))
+        return results
+
+# -------------------------- RECLAIM SPACE ------------------------------- #
+    def space_stats(self, detailed: bool = False) -> dict:
+        """Pages in the file and how many are free
+           detailed also reads every page to measure the unused space
+           inside them, None if SQLite was built without dbstat"""
+        with self.pool.connection() as connection:
+            def pragma(name):
+                return connection.execute(f"PRAGMA {name}").fetchone()[0]
+
+            stats = {
+                "auto_vacuum": AUTO_VACUUM_MODES[pragma("auto_vacuum")],
+                "page_size": pragma("page_size"),
+                "page_count": pragma("page_count"),
+                "freelist_count": pragma("freelist_count"),
+            }
+            stats["free_bytes"] = stats["freelist_count"] * stats["page_size"]
+            stats["free_percent"] = (
+                100 * stats["freelist_count"] / max(stats["page_count"], 1))
+            if detailed:
+                try:
+                    size, unused = connection.execute(
+                        "SELECT sum(pgsize), sum(unused) FROM dbstat"
+                    ).fetchone()
+                    stats["unused_bytes"] = unused
+                    stats["unused_percent"] = 100 * unused / max(size, 1)
+                except sqlite3.OperationalError:
+                    stats["unused_bytes"] = None
+                    stats["unused_percent"] = None
+        return stats
+
+    def reclaim_space(
+        self,
+        max_pages: int = None,
+        time_budget_ms: float = None
+    ) -> int:
+        """Give free pages back to the file system in small slices
+           Stops when there are no free pages, after max_pages or
+           after time_budget_ms, None is no limit. Each slice is a
+           short transaction, other connections write in between
+           Return the pages freed, 0 unless auto_vacuum is incremental"""
+        if time_budget_ms is not None:
+            deadline = time.perf_counter() + time_budget_ms / 1000
+        freed = 0
+        with self.pool.connection() as connection:
+            mode = connection.execute("PRAGMA auto_vacuum").fetchone()[0]
+            if AUTO_VACUUM_MODES[mode] != "incremental":
+                return 0
+            while max_pages is None or freed < max_pages:
+                if time_budget_ms is not None \
+                        and time.perf_counter() >= deadline:
+                    break
+                free = connection.execute(
+                    "PRAGMA freelist_count").fetchone()[0]
+                if free == 0:
+                    break
+                pages = min(free, VACUUM_SLICE)
+                if max_pages is not None:
+                    pages = min(pages, max_pages - freed)
+                # Each row stepped frees one page, fetchall()
+                # runs the pragma to the end
+                self.retry_busy(lambda: connection.execute(
+                    f"PRAGMA incremental_vacuum({pages})").fetchall())
+                freed += free - connection.execute(
+                    "PRAGMA freelist_count").fetchone()[0]
+        return freed
+
+    def vacuum(self):
+        """Rebuild the whole file, locks out every other connection
+           Also switches an older database to auto_vacuum INCREMENTAL
+           so reclaim_space() works from then on"""
+        with self.pool.connection() as connection:
+            connection.execute(
+                f"PRAGMA auto_vacuum = {self.config.auto_vacuum}")
+            self.retry_busy(lambda: connection.execute("VACUUM"))
 
 # -------------------- DATABASE DUMP TO SQL FILE ------------------------- #
-    def database_dump(self):
+    def database_dump(
+        self,
+        path: str = DUMP_FILE,
+        echo: bool = True,
+        progress=None
+    ) -> int:
+        """Write the database to path as SQL statements in one pass
+           A path ending in .gz, .xz or .zst is compressed as it is
+           written. echo also prints each line, progress(lines) is
+           called every PROGRESS_LINES lines
+           Return the lines written or None"""
         try:
-            with sqlite3.connect(self.database) as connection:
-                # Iterate through database, print SQL
+            lines = 0
+            with self.pool.connection() as connection, \
+                    open_dump(path, "w") as file:
+                # iterdump() streams, only one line is in memory
                 for line in connection.iterdump():
-                    print(line)
-
-                # Use with context manager to write and close/save the file
-                with open("database_dump.sql", "w") as file:
-                    # Iterate through database, write SQL to file
-                    for line in connection.iterdump():
-                        file.write(f"{line}\n")
-                print("File written to disk.")
+                    if is_search_dump(line):
+                        continue
+                    file.write(f"{line}\n")
+                    if echo:
+                        print(line)
+                    lines += 1
+                    if progress is not None and lines % PROGRESS_LINES == 0:
+                        progress(lines)
+            if progress is not None:
+                progress(lines)
+            print("File written to disk.")
+            return lines
         except Exception as e:
             print(f"There was an SQLite error: {e}")
 
+# -------------------- RESTORE SQL DUMP ---------------------------------- #
+    def restore_dump(self, path: str = DUMP_FILE, progress=None) -> int:
+        """Load a database_dump() file into this empty database
+           The file is read a statement at a time, compressed or not,
+           and run in one transaction, nothing is kept if it fails
+           progress(statements) is called every PROGRESS_LINES
+           Return the statements run or None"""
+        # Not from the pool, the bulk load PRAGMAs end with it
+        connection = sqlite3.connect(self.database, isolation_level=None)
+        try:
+            if connection.execute(
+                    "SELECT count(*) FROM sqlite_master").fetchone()[0]:
+                raise ValueError(
+                    f"{self.database} is not empty, restore into a new file")
+            # Before any table is created, like the pool does
+            connection.execute(
+                f"PRAGMA auto_vacuum = {self.config.auto_vacuum}")
+            for name, value in RESTORE_PRAGMAS.items():
+                connection.execute(f"PRAGMA {name} = {value}")
+
+            statements = 0
+            connection.execute("BEGIN")
+            with open_dump(path) as file:
+                statement = ""
+                for line in file:
+                    statement += line
+                    # A line can end inside a string or a trigger
+                    if not sqlite3.complete_statement(statement):
+                        continue
+                    if statement.strip() not in DUMP_TRANSACTION:
+                        connection.execute(statement)
+                        statements += 1
+                        if (progress is not None
+                                and statements % PROGRESS_LINES == 0):
+                            progress(statements)
+                    statement = ""
+            connection.execute("COMMIT")
+            if progress is not None:
+                progress(statements)
+        except (sqlite3.Error, OSError, ValueError) as e:
+            if connection.in_transaction:
+                connection.execute("ROLLBACK")
+            print(f"There was an error restoring {path}: {e}")
+            return None
+        finally:
+            connection.close()
+
+        # The dump has no full text indexes, build them
+        # from the restored records
+        self.create_table()
+        return statements
+
+# -------------------- ONLINE BACKUP ------------------------------------- #
+    def backup(
+        self,
+        path: str = BACKUP_FILE,
+        pages: int = BACKUP_PAGES,
+        sleep: float = BACKUP_SLEEP,
+        progress=None
+    ) -> bool:
+        """Copy the database file to path with the SQLite backup API
+           Copies pages at a time and sleeps in between so other
+           connections can still write, progress(copied, total) is
+           called after each step. A write from another connection
+           starts the copy over, pages=-1 copies in one step"""
+        def report(status, remaining, total):
+            if progress is not None:
+                progress(total - remaining, total)
+            # Called after each step, backup() itself only sleeps
+            # when the database is locked
+            if remaining:
+                time.sleep(sleep)
+
+        try:
+            with self.pool.connection() as connection:
+                target = sqlite3.connect(path)
+                try:
+                    connection.backup(
+                        target, pages=pages, progress=report, sleep=sleep)
+                finally:
+                    target.close()
+            return True
+        except sqlite3.Error as e:
+            print(f"There was an SQLite error: {e}")
+            return False
+
 # -------------------- EXECUTE SQL --------------------------------------- #
     def execute_sql(self, SQL: str, parameters: tuple = None):
         # This is an overloaded method in Python, parameters is optional
-        # If everything inside the with sqlite3.connect is successful
-        # connect.commit() and connect.close() are automatically called
+        # A connection is borrowed from the pool and returned afterwards
+        # If everything inside the with connection is successful
+        # connection.commit() is automatically called
         # when the with statement exits
         # If DATABASE does not exist, it is created
-        try:
-            with sqlite3.connect(self.database) as connection:
+        def execute():
+            with self.pool.connection() as connection, connection:
                 # Create cursor to work with SQL
                 cursor = connection.cursor()
                 if parameters is not None:
@@ -159,8 +1943,103 @@ class DBOperations:
                     cursor.executescript(SQL)
                 # Records are written automatically
                 # after the with statement exits
-                # All connections are closed
+                # The connection goes back to the pool
+            # The cursor has the lastrowid of an INSERT
+            return cursor
+
+        try:
+            # Another program holding the write lock is waited out
+            cursor = self.retry_busy(execute)
+            # Everything run here changes the database
+            self.clear_query_cache()
+            return cursor
+        except sqlite3.Error as e:
+            print(f"Error with sqlite3 {e}")
+        except Exception as e:
+            print(f"There was an error: {e}")
+
+    def execute_indexed(self, SQL: str, parameters: tuple):
+        """execute_sql() for a record write that the caller also makes
+           in the prefix indexes"""
+        return self.write_indexed(
+            lambda connection: connection.execute(SQL, parameters))
+
+    def write_indexed(self, write):
+        """Run write(connection) as one transaction and return its
+           result, for record writes the caller also makes in the
+           prefix indexes. It runs on the version connection, a
+           connection's own commits don't change its data_version,
+           so the check only sees writes the indexes are missing"""
+        def execute():
+            with self.version_connection:
+                return write(self.version_connection)
+
+        try:
+            with self.cache_lock:
+                # Writes from other connections first drop the indexes
+                self.check_data_version()
+                cursor = self.retry_busy(execute)
+                self.query_cache.clear()
+            return cursor
         except sqlite3.Error as e:
             print(f"Error with sqlite3 {e}")
         except Exception as e:
             print(f"There was an error: {e}")
+
+# -------------------- QUERY CACHE --------------------------------------- #
+    def cached_query(self, SQL: str, parameters: tuple = ()) -> list:
+        """Run a read query, or return its rows from the cache if
+           the database has not changed since it last ran
+           Each call gets its own list, callers can sort it"""
+        if not self.query_cache.memory_budget:
+            with self.pool.connection() as connection:
+                return connection.execute(SQL, parameters).fetchall()
+
+        key = (SQL, parameters)
+        with self.cache_lock:
+            self.check_data_version()
+            rows = self.query_cache.get(key)
+            generation = self.query_cache.generation
+        if rows is None:
+            with self.pool.connection() as connection:
+                rows = connection.execute(SQL, parameters).fetchall()
+            with self.cache_lock:
+                # Not kept if a write cleared the cache meanwhile
+                self.query_cache.put(key, rows, generation)
+        return list(rows)
+
+    def check_data_version(self):
+        """Clear the cache and the prefix indexes if any other
+           connection, in this program or another, has committed
+           since the last check
+           Call with cache_lock held"""
+        if self.version_connection is None:
+            # Same PRAGMAs as the pool, it also writes records
+            self.version_connection = self.pool._open()
+        version = self.version_connection.execute(
+            "PRAGMA data_version").fetchone()[0]
+        if version != self.data_version:
+            self.query_cache.clear()
+            # Loaded again from the table on the next prefix search
+            with self.prefix_lock:
+                self.prefix_indexes.clear()
+            self.data_version = version
+
+    def clear_query_cache(self):
+        """Forget every cached result after a write"""
+        with self.cache_lock:
+            self.query_cache.clear()
+
+# -------------------- RETRY WHEN BUSY ----------------------------------- #
+    def retry_busy(self, function):
+        """Call function, calling it again if the database is locked
+           Waits retry_delay, then twice as long each time, plus jitter
+           so programs retrying together don't collide again"""
+        for attempt in range(self.config.busy_retries + 1):
+            try:
+                return function()
+            except sqlite3.OperationalError as e:
+                if not is_busy(e) or attempt == self.config.busy_retries:
+                    raise
+            delay = self.config.retry_delay * 2 ** attempt
+            time.sleep(delay * random.uniform(0.5, 1.0))
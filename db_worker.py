@@ -0,0 +1,171 @@
+"""
+    Name: db_worker.py
+    Run database calls off the Tk main loop
+    Calls run one at a time on a worker thread, so a slow disk or a
+    locked database doesn't freeze the window. Finished calls are put
+    on a queue that the Tk main loop polls with after(), so callbacks
+    run on the Tk thread and can update widgets.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import queue
+import time
+
+# How often the Tk main loop checks for finished calls
+POLL_MS = 15
+# Only show the busy message for calls slower than this, in seconds
+BUSY_DELAY = 0.2
+BUSY_TEXT = "Working..."
+
+
+class Job:
+    """One database call waiting for, or running on, the worker"""
+
+    def __init__(self, callback=None, error=None, key=None):
+        # Called on the UI thread with the result or the exception
+        self.callback = callback
+        self.error = error
+        # Calls with the same key supersede each other
+        self.key = key
+        # True when a newer call with the same key replaced this one
+        self.cancelled = False
+        self.future = None
+        self.result = None
+        self.exception = None
+
+
+class DBWorker:
+    """Run DBOperations calls on a worker thread for a Tk window"""
+
+    def __init__(self, widget, status_label=None):
+        # Any widget of the window, after() runs on the Tk thread
+        self.widget = widget
+        # Shows BUSY_TEXT while a slow call is running
+        self.status_label = status_label
+        # One thread, so calls run and finish in the order submitted
+        self.executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="db_worker")
+        # Finished jobs waiting for the Tk thread
+        self.done = queue.Queue()
+        # Latest job for each key
+        self.latest = {}
+        # Jobs submitted but not yet delivered
+        self.pending = 0
+        self.poll_job = None
+        # When the worker became busy, and the status text it replaced
+        self.busy_since = None
+        self.idle_text = None
+
+# ------------------------------ SUBMIT ---------------------------------- #
+    def submit(
+        self,
+        function,
+        *args,
+        callback=None,
+        error=None,
+        key: str = None
+    ) -> Job:
+        """Run function(*args) on the worker thread, then callback(result)
+           on the Tk thread. A newer call with the same key supersedes
+           this one, it is cancelled if it hasn't started and its
+           callback is skipped if it has"""
+        if key is not None:
+            self.cancel(key)
+        job = Job(callback, error, key)
+        if key is not None:
+            self.latest[key] = job
+        self.pending += 1
+        job.future = self.executor.submit(self.run, job, function, args)
+        # A cancelled job never runs, deliver it so pending is counted down
+        job.future.add_done_callback(
+            lambda future: future.cancelled() and self.done.put(job))
+        self.start_polling()
+        return job
+
+    def run(self, job: Job, function, args: tuple):
+        """Worker thread, run one call and queue it for the Tk thread"""
+        try:
+            job.result = function(*args)
+        except Exception as e:
+            job.exception = e
+        self.done.put(job)
+
+    def cancel(self, key: str):
+        """Cancel the last call with key, or skip its callback"""
+        job = self.latest.pop(key, None)
+        if job is not None:
+            job.cancelled = True
+            job.future.cancel()
+
+# ------------------------------- POLL ----------------------------------- #
+    def start_polling(self):
+        if self.poll_job is None:
+            self.poll_job = self.widget.after(POLL_MS, self.poll)
+
+    def stop_polling(self):
+        if self.poll_job is not None:
+            self.widget.after_cancel(self.poll_job)
+            self.poll_job = None
+
+    def poll(self):
+        """Tk thread, deliver finished calls in the order they ran"""
+        self.poll_job = None
+        while True:
+            try:
+                job = self.done.get_nowait()
+            except queue.Empty:
+                break
+            self.pending -= 1
+            if self.latest.get(job.key) is job:
+                del self.latest[job.key]
+            if job.cancelled:
+                continue
+            if job.exception is not None:
+                if job.error is not None:
+                    job.error(job.exception)
+                else:
+                    self.show_error(job.exception)
+            elif job.callback is not None:
+                job.callback(job.result)
+
+        self.show_busy()
+        # Callbacks may have submitted more calls and started polling
+        if self.pending:
+            self.start_polling()
+
+    def show_error(self, exception: Exception):
+        print(exception)
+        if self.status_label is not None:
+            self.set_status(f"Error: {exception}")
+
+# --------------------------- BUSY INDICATOR ----------------------------- #
+    def show_busy(self):
+        """Show BUSY_TEXT while a call is slow, then put back
+           the status text it replaced"""
+        if self.status_label is None:
+            return
+        if self.pending:
+            if self.busy_since is None:
+                self.busy_since = time.monotonic()
+            elif (self.idle_text is None
+                  and time.monotonic() - self.busy_since >= BUSY_DELAY):
+                self.idle_text = self.get_status()
+                self.set_status(BUSY_TEXT)
+        else:
+            # Leave a status message a callback set while busy
+            if (self.idle_text is not None
+                    and self.get_status() == BUSY_TEXT):
+                self.set_status(self.idle_text)
+            self.busy_since = None
+            self.idle_text = None
+
+    def get_status(self) -> str:
+        return self.status_label.cget("text")
+
+    def set_status(self, text: str):
+        self.status_label.configure(text=text)
+
+# ------------------------------ SHUTDOWN -------------------------------- #
+    def shutdown(self):
+        """Wait for the running call, drop the rest"""
+        self.stop_polling()
+        self.executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,233 @@
+"""
+    Name: dedupe.py
+    Find possible duplicate contacts
+    Records are grouped into blocks by a shared key, normalized phone,
+    email or sound of the last name, and only records in the same block
+    are compared. This avoids comparing every record with every other.
+    Blocks are scored in a process pool and the pairs are written to
+    tbl_merge_suggestion for review.
+    Usage: python dedupe.py
+"""
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+import time
+import db_operations
+from db_operations import edit_distance, normalize_phone
+
+# Blocks larger than this are compared with a sliding window
+# over the sorted names instead of every pair
+MAX_BLOCK_SIZE = 200
+WINDOW = 20
+# Name similarity counts for most of the score, the same
+# phone or email adds the rest
+NAME_WEIGHT = 0.7
+PHONE_WEIGHT = 0.15
+EMAIL_WEIGHT = 0.15
+# Pairs scoring at least this much are suggested. A name alone
+# reaches it at 6/7 similar, "Jon Smith" and "John Smith", so the
+# sound of the last name blocks find typos with no phone or email
+# in common, as long as the records don't have different ones
+THRESHOLD = 0.6
+# Typos allowed when only the name links two records, more would
+# match different people with long similar names
+NAME_ONLY_EDITS = 1
+# Records sent to a worker process at a time
+TASK_SIZE = 20_000
+
+
+# ----------------------------- BLOCKING --------------------------------- #
+def blocking_keys(record: tuple) -> list:
+    """Keys of the blocks a record belongs to"""
+    id, first_name, last_name, phone, email, last_name_soundex = record
+    keys = []
+    digits = normalize_phone(phone or "")
+    # Short numbers like 911 are not useful for matching
+    if len(digits) >= 7:
+        keys.append("p:" + digits)
+    email = (email or "").strip().lower()
+    if "@" in email:
+        keys.append("e:" + email)
+    if last_name_soundex:
+        # Adding the first initial keeps common last names in
+        # smaller blocks, "Smith" alone would be huge
+        initial = (first_name or " ")[0].lower()
+        keys.append(f"s:{last_name_soundex}:{initial}")
+    return keys
+
+
+def compact(record: tuple) -> tuple:
+    """The normalized values a worker needs to score a record"""
+    id, first_name, last_name, phone, email, _ = record
+    name = " ".join(f"{first_name or ''} {last_name or ''}".lower().split())
+    return (
+        id,
+        name,
+        normalize_phone(phone or ""),
+        (email or "").strip().lower()
+    )
+
+
+# ------------------------------ SCORING --------------------------------- #
+def one_edit_distance(a: str, b: str) -> int:
+    """edit_distance(a, b, 1) in one pass, 0, 1 or 2 for more
+       Most pairs in a block are compared with at most one typo"""
+    if a == b:
+        return 0
+    if abs(len(a) - len(b)) > 1:
+        return 2
+    # Skip to the first letter that differs
+    i = 0
+    for letter_a, letter_b in zip(a, b):
+        if letter_a != letter_b:
+            break
+        i += 1
+    if (a[i + 1:] == b[i + 1:]  # Change
+            or a[i + 1:] == b[i:]  # Delete
+            or a[i:] == b[i + 1:]):  # Insert
+        return 1
+    return 2
+
+
+def score_pair(a: tuple, b: tuple):
+    """Return (score, reason) for two compacted records,
+       or None if they can't reach THRESHOLD"""
+    _, name_a, phone_a, email_a = a
+    _, name_b, phone_b, email_b = b
+    reasons = []
+    score = 0.0
+    if phone_a and phone_a == phone_b:
+        score += PHONE_WEIGHT
+        reasons.append("same phone")
+    if email_a and email_a == email_b:
+        score += EMAIL_WEIGHT
+        reasons.append("same email")
+
+    # The name similarity still needed to reach the threshold
+    # sets how many typos are allowed, before comparing the names
+    needed = (THRESHOLD - score) / NAME_WEIGHT
+    if needed > 1:
+        return None
+    longest = max(len(name_a), len(name_b), 1)
+    # The small amount keeps 6/7 from rounding down below 1 typo
+    max_distance = int((1 - needed) * longest + 1e-9)
+    if not reasons:
+        # Two John Smiths with different phones or emails are
+        # two people, the name only links a record to one that
+        # is missing them
+        if (phone_a and phone_b) or (email_a and email_b):
+            return None
+        max_distance = min(max_distance, NAME_ONLY_EDITS)
+    if max_distance == 0:
+        # Only the exact same name is good enough
+        distance = 0 if name_a == name_b else 1
+    elif max_distance == 1:
+        distance = one_edit_distance(name_a, name_b)
+    else:
+        distance = edit_distance(name_a, name_b, max_distance)
+    if distance > max_distance:
+        return None
+
+    similarity = 1 - distance / longest
+    score += NAME_WEIGHT * similarity
+    reasons.insert(0, "same name" if distance == 0 else "similar name")
+    return score, ", ".join(reasons)
+
+
+def block_pairs(block: list):
+    """Yield the pairs of records to compare in one block"""
+    if len(block) <= MAX_BLOCK_SIZE:
+        for i in range(len(block)):
+            for j in range(i + 1, len(block)):
+                yield block[i], block[j]
+    else:
+        # Sorted neighbourhood, only compare records within WINDOW
+        # places of each other by name, then by the name spelled
+        # backwards, which keeps a typo near the start next to
+        # the name it was meant to be
+        seen = set()
+        for key in (lambda record: record[1],
+                    lambda record: record[1][::-1]):
+            block = sorted(block, key=key)
+            for i in range(len(block)):
+                for j in range(i + 1, min(i + WINDOW, len(block))):
+                    pair = (block[i][0], block[j][0])
+                    if pair not in seen and pair[::-1] not in seen:
+                        seen.add(pair)
+                        yield block[i], block[j]
+
+
+def score_blocks(blocks: list) -> list:
+    """Worker process, score every pair in a list of blocks
+       Return (keep_id, merge_id, score, reason) for likely duplicates"""
+    suggestions = []
+    for block in blocks:
+        for a, b in block_pairs(block):
+            scored = score_pair(a, b)
+            if scored is not None:
+                # Keep the older record, merge the newer one into it
+                keep_id, merge_id = sorted((a[0], b[0]))
+                suggestions.append((keep_id, merge_id, *scored))
+    return suggestions
+
+
+def tasks(blocks):
+    """Group blocks into tasks of about TASK_SIZE records"""
+    task = []
+    size = 0
+    for block in blocks:
+        task.append(block)
+        size += len(block)
+        if size >= TASK_SIZE:
+            yield task
+            task = []
+            size = 0
+    if task:
+        yield task
+
+
+# --------------------------- FIND DUPLICATES ---------------------------- #
+def find_duplicates(
+    db_op: db_operations.DBOperations,
+    workers: int = None
+) -> int:
+    """Find likely duplicate records and save them as merge suggestions
+       Return the number of suggestions saved"""
+    # One pass over the table to build the blocks
+    blocks = defaultdict(list)
+    with db_op.pool.connection() as connection:
+        for record in connection.execute(
+                db_operations.SELECT_DEDUPE_RECORDS):
+            keys = blocking_keys(record)
+            if keys:
+                row = compact(record)
+                for key in keys:
+                    blocks[key].append(row)
+
+    # Only blocks with two or more records have pairs to compare
+    candidates = (block for block in blocks.values() if len(block) > 1)
+
+    # The same pair can be in several blocks, keep its best score
+    best = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for suggestions in executor.map(score_blocks, tasks(candidates)):
+            for keep_id, merge_id, score, reason in suggestions:
+                pair = (keep_id, merge_id)
+                if pair not in best or score > best[pair][2]:
+                    best[pair] = (keep_id, merge_id, score, reason)
+
+    db_op.save_merge_suggestions(best.values())
+    return len(best)
+
+
+# ------------------------------ START ----------------------------------- #
+if __name__ == "__main__":
+    db = db_operations.DBOperations("address_book.db")
+    db.create_table()
+    start = time.perf_counter()
+    count = find_duplicates(db)
+    print(f"{count} possible duplicates found "
+          f"in {time.perf_counter() - start:.1f} s")
+    for suggestion in db.fetch_merge_suggestions(limit=20):
+        id, score, reason, *records = suggestion
+        print(f"{score:.2f} {reason}: {records[:5]} / {records[5:]}")
+    db.close()
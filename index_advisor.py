@@ -0,0 +1,22 @@
+# Check that every query in db_operations uses an index
+# Prints the query plans and exits with 1 if any query
+# scans the whole table or sorts with a temp B-tree
+import sys
+import db_operations
+
+db = db_operations.DBOperations("address_book.db")
+db.create_table()
+
+problems = 0
+for name, detail, flagged in db.explain_query_plans():
+    if flagged:
+        problems += 1
+        print(f"!! {name}: {detail}")
+    else:
+        print(f"   {name}: {detail}")
+db.close()
+
+if problems:
+    print(f"{problems} query plan problem(s) found")
+    sys.exit(1)
+print("All queries use an index")
@@ -0,0 +1,95 @@
+"""
+    Name: prefix_index.py
+    In memory prefix index for as-you-type filtering
+    Values are kept in a sorted list, bisect finds the first
+    value that starts with the typed prefix
+"""
+from array import array
+from bisect import bisect_left
+import sys
+
+# Default memory budget for one index, 128 MB
+DEFAULT_MEMORY_BUDGET = 128 * 1024 * 1024
+
+
+class MemoryBudgetExceeded(Exception):
+    """The index would use more memory than its budget"""
+
+
+class PrefixIndex:
+    """Sorted array of lower case values with the matching record ids"""
+
+    def __init__(self, memory_budget: int = DEFAULT_MEMORY_BUDGET):
+        self.memory_budget = memory_budget
+        # keys[i] is the lower case value of the record ids[i]
+        # keys is kept sorted, ties are in id order
+        self.keys = []
+        self.ids = array("q")
+        # Estimated bytes used by the keys and ids
+        self.size = 0
+
+# -------------------------- ENTRY SIZE ---------------------------------- #
+    @staticmethod
+    def _entry_size(key: str) -> int:
+        # The string, its slot in the keys list and its id
+        return sys.getsizeof(key) + 16
+
+    def _charge(self, key: str):
+        """Add an entry to the memory estimate"""
+        self.size += self._entry_size(key)
+        if self.size > self.memory_budget:
+            raise MemoryBudgetExceeded(
+                f"Prefix index is over {self.memory_budget} bytes")
+
+# ----------------------------- LOAD ------------------------------------- #
+    def load(self, pairs):
+        """Build the index from (id, value) pairs"""
+        entries = []
+        for id, value in pairs:
+            key = (value or "").lower()
+            self._charge(key)
+            entries.append((key, id))
+        entries.sort()
+        self.keys = [key for key, _ in entries]
+        self.ids = array("q", (id for _, id in entries))
+
+# --------------------------- ADD / REMOVE ------------------------------- #
+    def add(self, id: int, value: str):
+        """Insert a record in sorted position"""
+        key = (value or "").lower()
+        self._charge(key)
+        # Find the position after any equal keys with a smaller id
+        index = bisect_left(self.keys, key)
+        while (index < len(self.keys) and self.keys[index] == key
+               and self.ids[index] < id):
+            index += 1
+        self.keys.insert(index, key)
+        self.ids.insert(index, id)
+
+    def remove(self, id: int, value: str):
+        """Remove a record, value is the value it was indexed with"""
+        key = (value or "").lower()
+        index = bisect_left(self.keys, key)
+        # Step through equal keys to find the record id
+        while index < len(self.keys) and self.keys[index] == key:
+            if self.ids[index] == id:
+                del self.keys[index]
+                del self.ids[index]
+                self.size -= self._entry_size(key)
+                return
+            index += 1
+
+# ----------------------------- MATCH ------------------------------------ #
+    def match(self, prefix: str, limit: int = 20) -> list:
+        """Return the ids of up to limit values starting with prefix"""
+        prefix = prefix.lower()
+        index = bisect_left(self.keys, prefix)
+        matches = []
+        while (len(matches) < limit and index < len(self.keys)
+               and self.keys[index].startswith(prefix)):
+            matches.append(self.ids[index])
+            index += 1
+        return matches
+
+    def __len__(self):
+        return len(self.keys)
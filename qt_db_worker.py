@@ -0,0 +1,37 @@
+"""
+    Name: qt_db_worker.py
+    Run database calls off the Qt event loop
+    The PySide6 version of db_worker.DBWorker. Calls run one at a time
+    on the same worker thread and a QTimer polls for finished calls,
+    so callbacks run on the GUI thread and can update widgets.
+    Nothing is emitted from the worker thread, it only fills a queue.
+"""
+# pip install pyside6
+from PySide6.QtCore import QTimer
+from db_worker import DBWorker, POLL_MS
+
+
+class QtDBWorker(DBWorker):
+    """Run DBOperations calls on a worker thread for a Qt window"""
+
+    def __init__(self, status_label=None, parent=None):
+        super().__init__(None, status_label)
+        # Single shot, restarted while calls are pending
+        self.poll_timer = QTimer(parent)
+        self.poll_timer.setSingleShot(True)
+        self.poll_timer.timeout.connect(self.poll)
+
+# ------------------------------- POLL ----------------------------------- #
+    def start_polling(self):
+        if not self.poll_timer.isActive():
+            self.poll_timer.start(POLL_MS)
+
+    def stop_polling(self):
+        self.poll_timer.stop()
+
+# ------------------------------- STATUS --------------------------------- #
+    def get_status(self) -> str:
+        return self.status_label.text()
+
+    def set_status(self, text: str):
+        self.status_label.setText(text)
@@ -0,0 +1,83 @@
+"""
+    Name: query_cache.py
+    In memory cache of query results
+    Results are kept by (SQL, parameters) in least recently used
+    order, the oldest are dropped when the cache is over its budget
+"""
+from collections import OrderedDict
+import sys
+
+# Default memory budget for the cache, 64 MB
+DEFAULT_CACHE_BUDGET = 64 * 1024 * 1024
+# Rows measured to estimate the size of a result
+SAMPLE_ROWS = 20
+
+
+class QueryCache:
+    """Least recently used query results with a memory budget"""
+
+    def __init__(self, memory_budget: int = DEFAULT_CACHE_BUDGET):
+        self.memory_budget = memory_budget
+        # (SQL, parameters): (rows, size), most recently used last
+        self.results = OrderedDict()
+        # Estimated bytes used by the results
+        self.size = 0
+        # Counts clears, a result read before a clear is out of date
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+
+# -------------------------- RESULT SIZE --------------------------------- #
+    @staticmethod
+    def _result_size(rows: list) -> int:
+        """Estimate the bytes used by a list of row tuples
+           Only the first rows are measured, a million row result
+           would take longer to measure than to read"""
+        size = sys.getsizeof(rows)
+        if not rows:
+            return size
+        sample = rows[:SAMPLE_ROWS]
+        sample_size = sum(
+            sys.getsizeof(row) + sum(sys.getsizeof(value) for value in row)
+            for row in sample
+        )
+        return size + sample_size * len(rows) // len(sample)
+
+# --------------------------- GET / PUT ---------------------------------- #
+    def get(self, key: tuple) -> list:
+        """Return the rows of a cached query, or None"""
+        entry = self.results.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.results.move_to_end(key)
+        return entry[0]
+
+    def put(self, key: tuple, rows: list, generation: int):
+        """Cache the rows of a query that started at generation
+           Nothing is kept if the cache was cleared since then,
+           or if the rows alone are over the budget"""
+        if generation != self.generation:
+            return
+        size = self._result_size(rows)
+        if size > self.memory_budget:
+            return
+        old = self.results.pop(key, None)
+        if old is not None:
+            self.size -= old[1]
+        self.results[key] = (rows, size)
+        self.size += size
+        # Drop the least recently used results
+        while self.size > self.memory_budget:
+            _, (_, dropped) = self.results.popitem(last=False)
+            self.size -= dropped
+
+    def clear(self):
+        """Forget every result, the database has changed"""
+        self.results.clear()
+        self.size = 0
+        self.generation += 1
+
+    def __len__(self):
+        return len(self.results)
@@ -0,0 +1,10 @@
+# Rebuild and optimize the full text search index
+import db_operations
+
+db = db_operations.DBOperations("address_book.db")
+db.create_table()
+db.rebuild_search_index()
+print("Search index rebuilt")
+db.optimize_search_index()
+print("Search index optimized")
+db.close()
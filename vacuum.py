@@ -1,6 +1,44 @@
-# Compress SQLite3 database
-import sqlite3
-conn = sqlite3.connect("address_book.db")
-conn.execute("VACUUM")
-print("Database vacuumed")
-conn.close()
+"""
+    Name: vacuum.py
+    Give the free space in address_book.db back to the file system
+    With auto_vacuum INCREMENTAL free pages are reclaimed a slice at
+    a time, so the address book stays usable while this runs. An
+    older database is switched over with one full VACUUM.
+    Usage: python vacuum.py [--pages N] [--time-ms N] [--full]
+"""
+import argparse
+import db_operations
+
+
+def show_stats(stats: dict):
+    print(f"auto_vacuum {stats['auto_vacuum']}, "
+          f"{stats['page_count']:,} pages of {stats['page_size']:,} bytes, "
+          f"{stats['freelist_count']:,} free "
+          f"({stats['free_percent']:.1f}%)")
+    if stats.get("unused_percent") is not None:
+        print(f"{stats['unused_percent']:.1f}% unused inside pages")
+
+
+parser = argparse.ArgumentParser(description=__doc__)
+parser.add_argument("--pages", type=int, default=None,
+                    help="most free pages to reclaim")
+parser.add_argument("--time-ms", type=float, default=None,
+                    help="stop after this many milliseconds")
+parser.add_argument("--full", action="store_true",
+                    help="rebuild the whole file with VACUUM")
+parser.add_argument("--stats", action="store_true",
+                    help="also measure the unused space inside pages")
+args = parser.parse_args()
+
+db = db_operations.DBOperations("address_book.db")
+stats = db.space_stats(args.stats)
+show_stats(stats)
+if args.full or stats["auto_vacuum"] != "incremental":
+    # Switches an older database to auto_vacuum INCREMENTAL
+    db.vacuum()
+    print("Database vacuumed")
+else:
+    freed = db.reclaim_space(args.pages, args.time_ms)
+    print(f"{freed:,} pages reclaimed")
+show_stats(db.space_stats(args.stats))
+db.close()
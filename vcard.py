@@ -0,0 +1,277 @@
+"""
+    Name: vcard.py
+    Import and export contacts as vCard (.vcf) files
+    Cards are read a line at a time and written as records come
+    off the cursor, so files of any size use little memory.
+    vCard 3.0 and 4.0 are read, N or FN, TEL and EMAIL are mapped
+    to the first_name, last_name, phone and email columns.
+    Usage: python vcard.py import contacts.vcf
+           python vcard.py export contacts.vcf [--version 4.0]
+"""
+import argparse
+import time
+import db_operations
+
+VERSIONS = ("3.0", "4.0")
+# Longest line in octets before it is folded onto the next line
+FOLD_OCTETS = 75
+# Cards checked against the database and inserted at a time
+BATCH_SIZE = 5000
+
+
+# ----------------------------- VALUES ----------------------------------- #
+def escape(value: str) -> str:
+    """Escape a text value for a vCard line"""
+    return (value.replace("\\", "\\\\").replace(";", "\\;")
+            .replace(",", "\\,").replace("\n", "\\n"))
+
+
+def unescape(value: str) -> str:
+    """Turn \\n, \\, \\; and \\\\ back into the characters"""
+    if "\\" not in value:
+        return value
+    characters = []
+    escaped = False
+    for character in value:
+        if escaped:
+            characters.append("\n" if character in "nN" else character)
+            escaped = False
+        elif character == "\\":
+            escaped = True
+        else:
+            characters.append(character)
+    return "".join(characters)
+
+
+def split_components(value: str) -> list:
+    """Split a structured value like N on the unescaped semicolons"""
+    components = [""]
+    escaped = False
+    for character in value:
+        if escaped:
+            components[-1] += "\\" + character
+            escaped = False
+        elif character == "\\":
+            escaped = True
+        elif character == ";":
+            components.append("")
+        else:
+            components[-1] += character
+    return [unescape(component) for component in components]
+
+
+# ----------------------------- READING ---------------------------------- #
+def unfold(file):
+    """Yield the logical lines of a vCard file
+       A line starting with a space or tab continues the line before"""
+    line = None
+    for raw in file:
+        raw = raw.rstrip("\r\n")
+        if raw[:1] in (" ", "\t") and line is not None:
+            line += raw[1:]
+            continue
+        if line is not None:
+            yield line
+        line = raw
+    if line is not None:
+        yield line
+
+
+def parse_line(line: str) -> tuple:
+    """Split a content line into (NAME, parameters, value)
+       item1.EMAIL;TYPE=work:bill@example.com gives
+       ("EMAIL", "TYPE=WORK", "bill@example.com")"""
+    # The value starts at the first colon not in a quoted parameter
+    quoted = False
+    for index, character in enumerate(line):
+        if character == '"':
+            quoted = not quoted
+        elif character == ":" and not quoted:
+            break
+    else:
+        return None
+    name, _, parameters = line[:index].partition(";")
+    # Drop a group prefix like item1.
+    name = name.rpartition(".")[2].upper()
+    return name, parameters.upper(), line[index + 1:]
+
+
+def is_preferred(parameters: str) -> bool:
+    # TYPE=pref in 3.0, PREF=1 in 4.0
+    return "PREF" in parameters
+
+
+def read_vcards(file):
+    """Yield a (first_name, last_name, phone, email) row per card"""
+    card = None
+    for line in unfold(file):
+        parsed = parse_line(line)
+        if parsed is None:
+            continue
+        name, parameters, value = parsed
+        if name == "BEGIN" and value.upper() == "VCARD":
+            card = {}
+        elif card is None:
+            continue
+        elif name == "END" and value.upper() == "VCARD":
+            row = card_row(card)
+            if any(row):
+                yield row
+            card = None
+        elif name == "N":
+            components = split_components(value) + ["", ""]
+            card["last_name"] = components[0].strip()
+            card["first_name"] = components[1].strip()
+        elif name == "FN":
+            card["full_name"] = unescape(value).strip()
+        elif name in ("TEL", "EMAIL"):
+            value = unescape(value).strip()
+            if name == "TEL" and value.lower().startswith("tel:"):
+                # vCard 4.0 phone numbers can be tel: URIs
+                value = value[4:]
+            # Keep the first, unless a later one is preferred
+            key = name.lower()
+            if key not in card or (is_preferred(parameters)
+                                   and not card.get(key + "_pref")):
+                card[key] = value
+                card[key + "_pref"] = is_preferred(parameters)
+
+
+def card_row(card: dict) -> tuple:
+    first_name = card.get("first_name", "")
+    last_name = card.get("last_name", "")
+    if not (first_name or last_name) and card.get("full_name"):
+        # No N property, the last word of FN is the last name
+        first_name, _, last_name = card["full_name"].rpartition(" ")
+    return first_name, last_name, card.get("tel", ""), card.get("email", "")
+
+
+# ----------------------------- WRITING ---------------------------------- #
+def fold(line: str) -> str:
+    """Break a line into FOLD_OCTETS octet pieces, without splitting
+       a UTF-8 character, each new piece starts with a space"""
+    if len(line.encode("utf-8")) <= FOLD_OCTETS:
+        return line + "\r\n"
+    pieces = []
+    piece = ""
+    size = 0
+    for character in line:
+        octets = len(character.encode("utf-8"))
+        # Leave room for the space that starts a continuation
+        limit = FOLD_OCTETS if not pieces else FOLD_OCTETS - 1
+        if size + octets > limit:
+            pieces.append(piece)
+            piece = ""
+            size = 0
+        piece += character
+        size += octets
+    pieces.append(piece)
+    return "\r\n ".join(pieces) + "\r\n"
+
+
+def card_lines(record: tuple, version: str) -> str:
+    """One contact as a vCard"""
+    id, first_name, last_name, phone, email = (
+        "" if value is None else str(value) for value in record)
+    lines = [
+        "BEGIN:VCARD",
+        f"VERSION:{version}",
+        f"N:{escape(last_name)};{escape(first_name)};;;",
+        f"FN:{escape(' '.join(filter(None, (first_name, last_name))))}",
+    ]
+    if phone:
+        lines.append(f"TEL;TYPE=voice:{escape(phone)}")
+    if email:
+        lines.append(f"EMAIL;TYPE=internet:{escape(email)}")
+    lines.append("END:VCARD")
+    return "".join(fold(line) for line in lines)
+
+
+def write_vcards(file, records, version: str = "3.0") -> int:
+    """Write records to an open file as vCards, return the count"""
+    if version not in VERSIONS:
+        raise ValueError(f"vCard version must be one of {VERSIONS}")
+    count = 0
+    for record in records:
+        file.write(card_lines(record, version))
+        count += 1
+    return count
+
+
+# ------------------------- IMPORT AND EXPORT ---------------------------- #
+def import_vcards(
+    db_op: db_operations.DBOperations,
+    path: str,
+    progress=None
+) -> tuple:
+    """Import the cards in a .vcf file, skipping any card whose email
+       is already in the address book or earlier in the file
+       progress(imported) is called after each batch
+       Return (imported, duplicates)"""
+    imported = 0
+    duplicates = 0
+    # Lower case emails seen in this file so far
+    seen = set()
+
+    def insert(batch):
+        nonlocal imported, duplicates
+        existing = db_op.existing_emails(
+            row[3] for row in batch if row[3])
+        rows = [row for row in batch if row[3].lower() not in existing]
+        duplicates += len(batch) - len(rows)
+        db_op.insert_many(rows)
+        imported += len(rows)
+        if progress is not None:
+            progress(imported)
+
+    batch = []
+    with open(path, encoding="utf-8-sig", newline="") as file:
+        for row in read_vcards(file):
+            email = row[3].lower()
+            if email:
+                if email in seen:
+                    duplicates += 1
+                    continue
+                seen.add(email)
+            batch.append(row)
+            if len(batch) >= BATCH_SIZE:
+                insert(batch)
+                batch = []
+    if batch:
+        insert(batch)
+    return imported, duplicates
+
+
+def export_vcards(
+    db_op: db_operations.DBOperations,
+    path: str,
+    version: str = "3.0"
+) -> int:
+    """Write every contact to a .vcf file, return the count"""
+    # vCard lines end with CRLF on every platform
+    with open(path, "w", encoding="utf-8", newline="") as file:
+        return write_vcards(file, db_op.iter_records(), version)
+
+
+# ------------------------------ START ----------------------------------- #
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("command", choices=("import", "export"))
+    parser.add_argument("path")
+    parser.add_argument("--version", choices=VERSIONS, default="3.0")
+    args = parser.parse_args()
+
+    db = db_operations.DBOperations("address_book.db")
+    db.create_table()
+    start = time.perf_counter()
+    if args.command == "import":
+        imported, duplicates = import_vcards(db, args.path)
+        count = imported
+        print(f"{imported:,} contacts imported, "
+              f"{duplicates:,} duplicate emails skipped")
+    else:
+        count = export_vcards(db, args.path, args.version)
+        print(f"{count:,} contacts exported to {args.path}")
+    elapsed = time.perf_counter() - start
+    print(f"{elapsed:.1f} s ({count / max(elapsed, 1e-9):,.0f} cards/s)")
+    db.close()
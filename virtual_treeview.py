@@ -0,0 +1,423 @@
+"""
+    Name: virtual_treeview.py
+    Virtual list mode for a ttk Treeview
+    Only the visible rows are Tk items. The rest stay in the database
+    and are paged in as the user scrolls, so the cost of showing the
+    list is the same for 10 records or a million.
+"""
+import db_operations
+
+
+class VirtualTreeview:
+    """Drive an existing Treeview and Scrollbar from DBOperations"""
+
+    def __init__(
+        self,
+        tree,
+        scrollbar,
+        db_op: db_operations.DBOperations,
+        order_by: str = "last_name",
+        direction: str = "asc",
+        overscan: int = 10,
+        worker=None
+    ):
+        self.tree = tree
+        self.scrollbar = scrollbar
+        self.db_op = db_op
+        self.order_by = order_by
+        self.direction = direction
+        # Visible rows, from the height= of the treeview
+        self.height = int(tree.cget("height"))
+        # Extra rows kept in memory above and below the visible rows
+        # so scrolling a few rows doesn't go back to the database
+        self.overscan = overscan
+        # DBWorker to read the database off the Tk thread,
+        # None reads on the Tk thread
+        self.worker = worker
+
+        # Row number of the first visible row
+        self.first = 0
+        # Number of rows in the list
+        self.total = 0
+        # Records in memory, rows[0] is row number window_start
+        self.rows = []
+        self.window_start = 0
+        # A fixed list of records, like search results,
+        # is shown instead of the database when not None
+        self.records = None
+        # Counts changes to the records in memory, a database read
+        # started before a change is out of date when it comes back
+        self.generation = 0
+        # Select the first (-1) or last (1) row after the next render
+        self.select_edge = None
+
+        # The scrollbar moves the window, not the treeview
+        self.scrollbar.configure(command=self.yview)
+        self.tree.configure(yscrollcommand="")
+
+        # Mouse wheel, Windows and macOS then Linux
+        self.tree.bind("<MouseWheel>", self.on_mouse_wheel)
+        self.tree.bind("<Button-4>", lambda event: self.scroll(-3))
+        self.tree.bind("<Button-5>", lambda event: self.scroll(3))
+        # Keep the arrow and page keys working past the visible rows
+        self.tree.bind("<Up>", lambda event: self.on_arrow_key(-1))
+        self.tree.bind("<Down>", lambda event: self.on_arrow_key(1))
+        self.tree.bind("<Prior>", lambda event: self.scroll(-self.height))
+        self.tree.bind("<Next>", lambda event: self.scroll(self.height))
+
+    def call(self, callback, function, *args, key: str = None):
+        """Run a database call, on the worker thread if there is one,
+           then pass the result to callback on the Tk thread"""
+        if self.worker is None:
+            callback(function(*args))
+        else:
+            self.worker.submit(function, *args, callback=callback, key=key)
+
+# ---------------------------- REFRESH ----------------------------------- #
+    def refresh(self):
+        """Reload the list from the database, keeping the position"""
+        self.records = None
+        # Forget the records in memory, they may have changed
+        self.rows = []
+        self.generation += 1
+        generation = self.generation
+        self.call(
+            lambda result: self.on_refresh(generation, result),
+            self.read_window, self.first, self.order_by, self.direction,
+            key="view refresh"
+        )
+
+    def read_window(self, first: int, order_by: str, direction: str):
+        """Count the records and read the rows around first
+           Runs on the worker thread, so it only uses its arguments"""
+        total = self.db_op.count_records()
+        first = max(0, min(first, total - self.height))
+        start = max(0, first - self.overscan)
+        rows = self.db_op.fetch_window(
+            start, self.height + 2 * self.overscan, order_by, direction)
+        return total, start, rows
+
+    def on_refresh(self, generation: int, result: tuple):
+        # A newer refresh or list replaced this one
+        if generation != self.generation:
+            return
+        self.total, self.window_start, self.rows = result
+        self.generation += 1
+        self.scroll_to(self.first)
+
+    def set_order(self, order_by: str, direction: str = "asc"):
+        """Sort the list by a column, back to the top"""
+        self.order_by = order_by
+        self.direction = direction
+        self.first = 0
+        if self.records is not None:
+            # Sort a fixed list in memory, the same way
+            # ORDER BY column, id sorts in the database
+            self.records.sort(
+                key=lambda record: db_operations.sort_key(record, order_by),
+                reverse=(direction == "desc")
+            )
+            self.rows = []
+            self.generation += 1
+            self.scroll_to(0)
+        else:
+            self.refresh()
+
+    def show_records(self, records: list):
+        """Show a fixed list of records instead of the database"""
+        # Kept in the list order so edits can be put in place
+        self.records = sorted(
+            records,
+            key=lambda record: db_operations.sort_key(record, self.order_by),
+            reverse=(self.direction == "desc")
+        )
+        self.total = len(self.records)
+        self.rows = []
+        self.generation += 1
+        self.scroll_to(0)
+
+# ------------------------ INCREMENTAL UPDATES --------------------------- #
+    def insert_record(
+        self,
+        first_name: str,
+        last_name: str,
+        phone: str,
+        email: str,
+        callback=None
+    ):
+        """Insert a record and show it in its sorted place without
+           reloading, callback gets the new record or None"""
+        self.write(callback, "insert", self.db_op.insert_record,
+                   first_name, last_name, phone, email)
+
+    def update_record(
+        self,
+        first_name: str,
+        last_name: str,
+        phone: str,
+        email: str,
+        id: int,
+        callback=None
+    ):
+        """Update a record and move it to its new sorted place,
+           callback gets the updated record or None"""
+        self.write(callback, "update", self.db_op.update_record,
+                   first_name, last_name, phone, email, id)
+
+    def delete_record(self, id: int, callback=None):
+        """Delete a record and remove it without reloading,
+           callback gets the deleted id or None"""
+        self.write(callback, "delete", self.db_op.delete_record, id)
+
+    def write(self, callback, change: str, function, *args):
+        """Run a database write, then patch the changed record into
+           the list. The record's row number is read in the same call
+           so nothing can change the table in between"""
+        generation = self.generation
+        order_by, direction = self.order_by, self.direction
+        # A fixed list finds the place in memory
+        find_position = change != "delete" and self.records is None
+
+        def run():
+            result = function(*args)
+            position = None
+            if result is not None and find_position:
+                position = self.db_op.record_position(
+                    result, order_by, direction)
+            return result, position
+
+        def done(written):
+            result, position = written
+            if result is not None:
+                self.patch(change, result, position, generation)
+            if callback is not None:
+                callback(result)
+
+        self.call(done, run)
+
+    def patch(self, change: str, result, position: int, generation: int):
+        """Apply a finished write to the records in memory"""
+        id = result if change == "delete" else result[0]
+        if self.records is not None:
+            # A fixed list is only in memory, patch it directly
+            self.remove(self.records, id)
+            if change != "delete":
+                self.records.insert(
+                    self.position(self.records, result), result)
+            self.total = len(self.records)
+            self.rows = []
+        elif generation != self.generation:
+            # The rows in memory changed since the write started,
+            # they may already have the change, so read them again
+            self.refresh()
+            return
+        else:
+            row = self.remove(self.rows, id)
+            if row is None and change == "update":
+                # Not in memory, only a reload knows where it was
+                self.refresh()
+                return
+            if row is not None and self.window_start + row < self.first:
+                self.first -= 1
+            if change == "insert":
+                self.total += 1
+            elif change == "delete":
+                self.total -= 1
+            if change != "delete":
+                self.place(result, position)
+        self.generation += 1
+        self.scroll_to(self.first)
+
+    def place(self, record: tuple, position: int):
+        """Put a record at row number position of the list,
+           keeping the same records on screen"""
+        window_end = self.window_start + len(self.rows)
+        if position < self.window_start:
+            # Every record in memory moves down one row
+            self.window_start += 1
+        elif position <= window_end:
+            self.rows.insert(position - self.window_start, record)
+        if position < self.first:
+            self.first += 1
+
+    def position(self, records: list, record: tuple) -> int:
+        """Number of records in a list that sort before record"""
+        key = db_operations.sort_key(record, self.order_by)
+        if self.direction == "desc":
+            return sum(1 for other in records
+                       if db_operations.sort_key(other, self.order_by) > key)
+        return sum(1 for other in records
+                   if db_operations.sort_key(other, self.order_by) < key)
+
+    @staticmethod
+    def remove(records: list, id: int):
+        """Remove the record with id from a list, return its index
+           or None if it isn't in the list"""
+        for index, record in enumerate(records):
+            # The treeview hands back ids as text
+            if str(record[0]) == str(id):
+                del records[index]
+                return index
+        return None
+
+# ---------------------------- SCROLLING --------------------------------- #
+    def yview(self, *args):
+        """Scrollbar command, moveto a fraction or scroll by units/pages"""
+        if args[0] == "moveto":
+            self.scroll_to(round(float(args[1]) * self.total))
+        elif args[0] == "scroll":
+            step = int(args[1])
+            if args[2] == "pages":
+                step *= self.height
+            self.scroll(step)
+
+    def on_mouse_wheel(self, event):
+        # Windows sends multiples of 120, macOS sends small numbers
+        if abs(event.delta) >= 120:
+            step = -event.delta // 120
+        else:
+            step = -event.delta
+        self.scroll(step * 3)
+        # Stop the treeview scrolling its own items
+        return "break"
+
+    def on_arrow_key(self, step: int):
+        """Scroll when the arrow key moves past the visible rows"""
+        items = self.tree.get_children()
+        if not items:
+            return "break"
+        focus = self.tree.focus()
+        edge = items[0] if step < 0 else items[-1]
+        if focus != edge:
+            # Let the treeview move the selection inside the window
+            return None
+        # Select the row that scrolls into view once it is shown
+        self.select_edge = step
+        self.scroll(step)
+        return "break"
+
+    def scroll(self, step: int):
+        self.scroll_to(self.first + step)
+
+    def scroll_to(self, first: int):
+        """Show the rows starting at row number first"""
+        self.first = max(0, min(first, self.total - self.height))
+        end = min(self.first + self.height, self.total)
+
+        # Load more records if the visible rows are not all in memory
+        window_end = self.window_start + len(self.rows)
+        if self.first < self.window_start or end > window_end:
+            self.load(self.first)
+        else:
+            self.render()
+
+# ---------------------------- LOADING ----------------------------------- #
+    def load(self, first: int):
+        """Fill rows with the visible records plus the overscan"""
+        start = max(0, first - self.overscan)
+        count = self.height + 2 * self.overscan
+
+        rows = self.rows
+        window_end = self.window_start + len(rows)
+        if self.records is not None:
+            self.rows = self.records[start:start + count]
+            self.window_start = start
+            self.render()
+            return
+        elif rows and self.window_start <= start < window_end:
+            # Scrolled down, keep the rows still in the window and
+            # seek after the last record instead of counting rows
+            keep = rows[start - self.window_start:]
+            key = db_operations.page_key(rows[-1], self.order_by)
+            read = (self.db_op.fetch_page, key, count - len(keep),
+                    self.order_by, self.direction)
+
+            def combine(page):
+                return keep + page
+        elif rows and start < self.window_start < start + count:
+            # Scrolled up, seek backwards before the first record
+            key = db_operations.page_key(rows[0], self.order_by)
+            backwards = "desc" if self.direction == "asc" else "asc"
+            read = (self.db_op.fetch_page, key, self.window_start - start,
+                    self.order_by, backwards)
+
+            def combine(before):
+                before.reverse()
+                return before + rows[:count - len(before)]
+        else:
+            # Jumped somewhere new
+            read = (self.db_op.fetch_window, start, count,
+                    self.order_by, self.direction)
+
+            def combine(window):
+                return window
+
+        generation = self.generation
+
+        def on_load(page):
+            if generation != self.generation:
+                # The rows changed while reading, start again from them
+                self.scroll_to(self.first)
+                return
+            self.rows = combine(page)
+            self.window_start = start
+            self.generation += 1
+            if self.first == first:
+                self.render()
+            else:
+                # Scrolled on while reading
+                self.scroll_to(self.first)
+
+        # A newer scroll supersedes a read that hasn't come back
+        self.call(on_load, *read, key="view load")
+
+    def render(self):
+        """Show the visible records in the treeview
+           Each item's iid is its record id, records still on screen
+           keep their item, so they keep the selection and focus"""
+        selection = self.tree.selection()
+        focus = self.tree.focus()
+        offset = self.first - self.window_start
+        visible = self.rows[offset:offset + self.height]
+        iids = {str(record[0]) for record in visible}
+        # Only delete the items of records that scrolled away
+        gone = [item for item in self.tree.get_children()
+                if item not in iids]
+        if gone:
+            self.tree.delete(*gone)
+        for index, (id, first_name, last_name, phone, email) in (
+                enumerate(visible)):
+            iid = str(id)
+            values = (id, first_name, last_name, phone, email)
+            if self.tree.exists(iid):
+                # The record may have been edited or moved
+                self.tree.item(iid, text=id, values=values)
+                self.tree.move(iid, "", index)
+            else:
+                self.tree.insert(
+                    "", index, iid=iid, text=id, values=values)
+
+        # Put back the selection and focus of records still on screen
+        # Only when they changed, <<TreeviewSelect>> fills the entries
+        selection = [item for item in selection if item in iids]
+        if set(self.tree.selection()) != set(selection):
+            self.tree.selection_set(selection)
+        if focus in iids and self.tree.focus() != focus:
+            self.tree.focus(focus)
+
+        if self.select_edge is not None:
+            items = self.tree.get_children()
+            if items:
+                edge = items[0] if self.select_edge < 0 else items[-1]
+                self.tree.selection_set(edge)
+                self.tree.focus(edge)
+            self.select_edge = None
+
+        # Move the scrollbar to show where the window is in the list
+        if self.total:
+            self.scrollbar.set(
+                self.first / self.total,
+                min(1.0, (self.first + self.height) / self.total)
+            )
+        else:
+            self.scrollbar.set(0.0, 1.0)